@@ -0,0 +1,156 @@
+from flask import Blueprint, current_app, jsonify, request
+from flask_login import current_user
+from extensions import db
+from models import Organization, Junction
+from queries import tasksById
+from membership import userMemberships, isMember, invalidateMembership
+from taskservice import createTasks, assignTasks, completeTasks
+from events import publish
+
+
+# Versioned JSON API over the task and membership models. Batch endpoints validate the whole batch first and then apply it
+# in a single transaction, so a request either changes every listed task or none of them.
+# Authentication uses the normal login session. Write requests must be sent as application/json, which browsers won't send
+# cross site without a CORS preflight, so the API doesn't need the CSRF tokens used by the HTML forms.
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+class ApiError(Exception):
+    def __init__(self, status, message, **details):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.details = details
+
+@api.errorhandler(ApiError)
+def handleApiError(error):
+    return jsonify(error=error.message, **error.details), error.status
+
+@api.before_request
+def requireJsonSession():
+    if not current_user.is_authenticated:
+        raise ApiError(401, 'Login required')
+    if request.method in ('POST', 'PUT', 'PATCH', 'DELETE') and not request.is_json:
+        raise ApiError(415, 'Request body must be application/json')
+
+def jsonBody():
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        raise ApiError(400, 'Request body must be a JSON object')
+    return body
+
+def idList(value, field): # validate a list of integer ids from the request, limited to API_MAX_BATCH
+    if not isinstance(value, list) or not value or not all(isId(item) for item in value):
+        raise ApiError(400, f'{field} must be a non-empty list of integer ids')
+    if len(value) > current_app.config['API_MAX_BATCH']:
+        raise ApiError(400, f"At most {current_app.config['API_MAX_BATCH']} ids per request")
+    return value
+
+def isId(value): # JSON integer, true/false are ints in Python but not ids
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def taskJson(task):
+    detail = task.detail
+    return {
+        'id': task.id,
+        'name': task.name,
+        'organizationId': task.organizationId,
+        'taskComplete': task.taskComplete,
+        'assignedToUserId': task.assignedToUserId,
+        'createdByUserId': detail.createdByUserId if detail else None,
+        'assignedByUserId': detail.assignedByUserId if detail else None,
+        'dateComplete': detail.dateComplete.isoformat() if detail and detail.dateComplete else None,
+        'notes': detail.notes if detail else None,
+    }
+
+def loadTasks(taskIds): # tasks for the ids, 404 listing any ids that don't exist
+    tasks = tasksById(taskIds)
+    missing = sorted(set(taskIds) - {task.id for task in tasks})
+    if missing:
+        raise ApiError(404, 'Tasks not found', taskIds=missing)
+    return tasks
+
+@api.route('/tasks', methods=['GET'])
+def getTasks(): # GET /api/v1/tasks?ids=1,2,3 returns the listed tasks from organizations the user belongs to
+    try:
+        taskIds = [int(taskId) for taskId in request.args.get('ids', '').split(',') if taskId.strip()]
+    except ValueError:
+        raise ApiError(400, 'ids must be a comma separated list of integer ids')
+    idList(taskIds, 'ids')
+    memberships = userMemberships(current_user.id)
+    tasks = [task for task in tasksById(taskIds) if task.organizationId in memberships] # tasks outside the user's organizations are left out
+    return jsonify(tasks=[taskJson(task) for task in tasks])
+
+@api.route('/tasks', methods=['POST'])
+def postTasks(): # {"tasks": [{"name": ..., "organizationId": ..., "notes": ..., "assignToMe": false}, ...]}
+    specs = jsonBody().get('tasks')
+    if not isinstance(specs, list) or not specs:
+        raise ApiError(400, 'tasks must be a non-empty list')
+    if len(specs) > current_app.config['API_MAX_BATCH']:
+        raise ApiError(400, f"At most {current_app.config['API_MAX_BATCH']} tasks per request")
+    memberships = userMemberships(current_user.id)
+    for index, spec in enumerate(specs):
+        if not isinstance(spec, dict) or not isinstance(spec.get('name'), str) or not 1 <= len(spec['name'].strip()) <= 45:
+            raise ApiError(400, 'Every task needs a name of 1 to 45 characters', index=index)
+        if spec.get('notes') is not None and not isinstance(spec['notes'], str):
+            raise ApiError(400, 'notes must be a string', index=index)
+        if not isId(spec.get('organizationId')):
+            raise ApiError(400, 'organizationId must be an integer', index=index)
+        if not isinstance(spec.get('assignToMe', False), bool):
+            raise ApiError(400, 'assignToMe must be true or false', index=index)
+        if spec['organizationId'] not in memberships:
+            raise ApiError(403, 'You can only create tasks in organizations you belong to', index=index)
+    specs = [dict(spec, name=spec['name'].strip()) for spec in specs] # stored without the surrounding whitespace that was validated away
+    payload = [taskJson(task) for task in createTasks(specs, current_user.id)] # serialized before commit expires the objects
+    db.session.commit()
+    return jsonify(tasks=payload), 201
+
+@api.route('/tasks/assign', methods=['POST'])
+def postAssignTasks(): # {"taskIds": [...], "userId": n}, same rules as the task details page
+    body = jsonBody()
+    taskIds = idList(body.get('taskIds'), 'taskIds')
+    userId = body.get('userId')
+    if not isId(userId):
+        raise ApiError(400, 'userId must be an integer')
+    tasks = loadTasks(taskIds)
+    memberships = userMemberships(current_user.id)
+    targetChecked = {}
+    forbidden = []
+    for task in tasks:
+        if task.organizationId not in memberships:
+            forbidden.append(task.id)
+        elif memberships[task.organizationId]: # org admins can assign any task to any member
+            if task.organizationId not in targetChecked:
+                targetChecked[task.organizationId] = isMember(userId, task.organizationId)
+            if not targetChecked[task.organizationId]:
+                forbidden.append(task.id)
+        elif not (userId == current_user.id == task.detail.createdByUserId and task.assignedToUserId is None): # others may only take unassigned tasks they created
+            forbidden.append(task.id)
+    if forbidden:
+        raise ApiError(403, 'Not allowed to assign these tasks to that user', taskIds=forbidden)
+    payload = [taskJson(task) for task in assignTasks(tasks, userId, current_user.id)]
+    db.session.commit()
+    return jsonify(tasks=payload)
+
+@api.route('/tasks/complete', methods=['POST'])
+def postCompleteTasks(): # {"taskIds": [...]}, only the assigned user can complete a task
+    taskIds = idList(jsonBody().get('taskIds'), 'taskIds')
+    tasks = loadTasks(taskIds)
+    forbidden = [task.id for task in tasks if task.assignedToUserId != current_user.id]
+    if forbidden:
+        raise ApiError(403, 'Only the assigned user can complete a task', taskIds=forbidden)
+    payload = [taskJson(task) for task in completeTasks(tasks, current_user.id)]
+    db.session.commit()
+    return jsonify(tasks=payload)
+
+@api.route('/organizations/<int:orgId>/join', methods=['POST'])
+def postJoinOrganization(orgId):
+    org = Organization.query.get(orgId)
+    if not org:
+        raise ApiError(404, 'Organization not found')
+    if not isMember(current_user.id, org.id):
+        db.session.add(Junction(organizationId=org.id, userId=current_user.id, orgAdmin=False))
+        publish('member.joined', org.id, actorUserId=current_user.id)
+        db.session.commit()
+        invalidateMembership(current_user.id, org.id)
+    return jsonify(organizationId=org.id, userId=current_user.id, member=True)
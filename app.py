@@ -1,22 +1,40 @@
+import sys
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
-from flask_login import LoginManager
+from config import Config, engineOptions
+from extensions import db, loginManager, migrations
+from instrumentation import instrument
+from responsecache import initResponseCache
 
-app = Flask(__name__)
 
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///TaskTracker_db.db' #set URI for database
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False #improve db efficiency
-app.config['SECRET_KEY'] = 'ThisShouldBeHarderToGuess' #enable CSRF for Flask forms
+def create_app(config=None):
+    # build a configured app. config is a dict of overrides applied on top of config.py, e.g. a test database URI
+    # blueprints are imported here rather than at module level, so importing a model or service never imports the views
+    app = Flask(__name__)
+    app.config.from_object(Config) #database, pool and app settings, overridable with environment variables (see config.py)
+    if config:
+        app.config.update(config)
+        if 'SQLALCHEMY_DATABASE_URI' in config and 'SQLALCHEMY_ENGINE_OPTIONS' not in config: # pool settings for the database actually used
+            app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engineOptions(config['SQLALCHEMY_DATABASE_URI'])
 
-db = SQLAlchemy(app) #instantiate db
+    if app.config['PROXY_FIX_HOPS']: # client address and scheme as seen by the outermost trusted proxy, the login throttle keys on request.remote_addr
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        hops = app.config['PROXY_FIX_HOPS']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops, x_host=hops)
+    db.init_app(app)
+    loginManager.init_app(app)
+    initResponseCache(app) #optional page and fragment cache (see responsecache.py)
+    instrument(app) #per route SQL/render/wall time metrics on /metrics (see instrumentation.py)
+    if 'flask_migrate' in sys.modules: # the flask CLI has loaded Flask-Migrate's `db` commands, web workers and tests never pay for alembic
+        migrations(app)
 
-#create login manager and set default route
-loginManager = LoginManager()
-loginManager.init_app(app)
-loginManager.login_view = 'login'
+    import models #register the models and the login manager's user loader
+    import routes, users, organizations, tasks
+    from api import api
+    from commands import commands
+    for blueprint in (routes.blueprint, users.blueprint, organizations.blueprint, tasks.blueprint, api, commands):
+        app.register_blueprint(blueprint)
+    return app
 
-from routes import *
-from models import *
 
 if __name__ == "__main__":
-    app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
+    create_app().run(host='0.0.0.0', port=5000)
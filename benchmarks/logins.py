@@ -0,0 +1,53 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Password verification throughput, the CPU cost behind every login, for hash methods and process pool sizes.
+# usage (from the repo root): python -m benchmarks.logins --method pbkdf2:sha256:260000 --method pbkdf2:sha256:100000 --workers 0 --workers 2
+# --threads simulates that many request threads logging in at once. cores is how many cores the hashing could use
+# (pool size, or the thread count capped at the CPU count when hashing inline), and per_core divides logins/sec by it.
+
+PASSWORD = 'benchmark'
+
+def measure(method, workers, threads, count):
+    from passwords import PasswordHasher
+    hasher = PasswordHasher(method, 16, workers)
+    hasher.start()
+    passwordHash = hasher.hash(PASSWORD)
+    hasher.verify(passwordHash, PASSWORD) # warm up
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        results = list(pool.map(lambda i: hasher.verify(passwordHash, PASSWORD), range(count)))
+    elapsed = time.perf_counter() - started
+    hasher.shutdown()
+    if not all(results):
+        raise RuntimeError(f'{method}: password did not verify')
+    cores = min(workers, threads) if workers else min(threads, os.cpu_count() or 1)
+    rate = count / elapsed
+    return {'method': hasher.method, 'workers': workers, 'threads': threads, 'logins': count, 'logins_per_sec': round(rate, 1), 'cores': cores, 'logins_per_sec_per_core': round(rate / cores, 1), 'ms_per_login': round(elapsed / count * 1000 * threads, 2)}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure password verification throughput (logins/sec per core).')
+    parser.add_argument('--method', action='append', help='werkzeug hash method, repeatable (default: pbkdf2:sha256:260000)')
+    parser.add_argument('--workers', action='append', type=int, help='PASSWORD_HASH_WORKERS values to try, repeatable (default: 0)')
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 1, help='concurrent logins (default: CPU count)')
+    parser.add_argument('--count', type=int, default=50, help='logins per measurement')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    args = parser.parse_args(argv)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    results = []
+    for method in args.method or ['pbkdf2:sha256:260000']:
+        for workers in args.workers or [0]:
+            result = measure(method, workers, args.threads, args.count)
+            results.append(result)
+            print(f"{result['method']:<28} workers={workers:<3} threads={args.threads:<3} {result['logins_per_sec']:>8} logins/s  {result['logins_per_sec_per_core']:>8} per core  {result['ms_per_login']:>8} ms/login")
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'cpus': os.cpu_count(), 'results': results}, output, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+import argparse
+import http.cookiejar
+import json
+import os
+import re
+import statistics
+import sys
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from benchmarks.seed import BENCH_PASSWORD, useDatabase
+
+
+# Drive the core routes against a seeded database (see benchmarks/seed.py) and report latency, throughput and SQL query counts.
+# in process with the Flask test client:  python -m benchmarks.run --db bench.db --output results.json
+# over HTTP against a running server:      python -m benchmarks.run --url http://127.0.0.1:5000 --concurrency 8
+# compare two runs for regressions:        python -m benchmarks.run --db bench.db --compare baseline.json
+
+USERNAME = 'user1' # creator and admin of org1 in every seeded database
+ORG_NAME = 'org1'
+
+def routeRequests(taskId): # (report name, method, path, form data) for every benchmarked route
+    return [
+        ('login', 'POST', '/login', {'username': USERNAME, 'password': BENCH_PASSWORD}),
+        ('tasks', 'GET', f'/tasks/{USERNAME}', None),
+        ('organizationTasks', 'GET', f'/organizations/tasks/{ORG_NAME}', None),
+        ('organizationMembers', 'GET', f'/organizations/members/{ORG_NAME}', None),
+        ('taskDetails', 'GET', f'/tasks/details/{taskId}', None),
+        ('taskCreation', 'POST', '/tasks/create', {'name': 'Benchmark task', 'notes': 'created by benchmarks/run.py', 'organizationId': '1'}),
+    ]
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def summarize(latencies, elapsed, queries=None):
+    result = {
+        'requests': len(latencies),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+    }
+    result['queries_per_request'] = round(statistics.mean(queries), 2) if queries else None
+    return result
+
+def runInProcess(dbPath, iterations, warmup):
+    useDatabase(dbPath)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from app import create_app
+    from extensions import db
+    from models import Task
+    from sqlalchemy import event
+    app = create_app({'WTF_CSRF_ENABLED': False}) # the test client posts forms directly
+    queryCount = [0]
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: queryCount.__setitem__(0, queryCount[0] + 1))
+        taskId = Task.query.filter_by(organizationId=1).order_by(Task.id).first().id
+    results = {}
+    for name, method, path, data in routeRequests(taskId):
+        client = app.test_client()
+        if name != 'login':
+            client.post('/login', data={'username': USERNAME, 'password': BENCH_PASSWORD})
+        latencies, queries = [], []
+        for i in range(warmup + iterations):
+            if name == 'login':
+                client.get('/logout')
+            queryCount[0] = 0
+            started = time.perf_counter()
+            response = client.open(path, method=method, data=data)
+            latency = time.perf_counter() - started
+            if response.status_code >= 400:
+                raise RuntimeError(f'{name}: {method} {path} returned {response.status_code}')
+            if i >= warmup:
+                latencies.append(latency)
+                queries.append(queryCount[0])
+        results[name] = summarize(latencies, sum(latencies), queries)
+    return results
+
+class HttpSession: # cookie aware client that logs in through the real login form, CSRF token included
+    def __init__(self, baseUrl):
+        self.baseUrl = baseUrl.rstrip('/')
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def request(self, method, path, data=None, csrfToken=None):
+        if data is not None:
+            data = dict(data, csrf_token=csrfToken or self.csrfToken(path))
+            body = urllib.parse.urlencode(data).encode()
+        else:
+            body = None
+        with self.opener.open(urllib.request.Request(self.baseUrl + path, data=body, method=method), timeout=30) as response:
+            return response.status, response.read()
+
+    def csrfToken(self, path):
+        status, page = self.request('GET', path)
+        match = re.search(rb'name="csrf_token" type="hidden" value="([^"]+)"', page)
+        return match.group(1).decode() if match else ''
+
+def runHttp(baseUrl, iterations, warmup, concurrency):
+    probe = HttpSession(baseUrl)
+    probe.request('POST', '/login', {'username': USERNAME, 'password': BENCH_PASSWORD})
+    status, page = probe.request('GET', f'/organizations/tasks/{ORG_NAME}')
+    taskId = int(re.search(rb'/tasks/details/(\d+)', page).group(1))
+    results = {}
+    for name, method, path, data in routeRequests(taskId):
+        sessions = [HttpSession(baseUrl) for i in range(concurrency)]
+        if name != 'login':
+            for session in sessions:
+                session.request('POST', '/login', {'username': USERNAME, 'password': BENCH_PASSWORD})
+
+        def worker(session, count):
+            latencies = []
+            for i in range(count):
+                if name == 'login':
+                    session.request('GET', '/logout')
+                csrfToken = session.csrfToken(path) if data is not None else None # fetched outside the timed request
+                started = time.perf_counter()
+                session.request(method, path, data, csrfToken)
+                latencies.append(time.perf_counter() - started)
+            return latencies
+
+        for session in sessions:
+            worker(session, warmup)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            perWorker = list(pool.map(lambda session: worker(session, max(1, iterations // concurrency)), sessions))
+        elapsed = time.perf_counter() - started
+        results[name] = summarize([latency for latencies in perWorker for latency in latencies], elapsed)
+    return results
+
+def compare(current, baseline, threshold): # routes whose p50 or p99 got slower than baseline by more than threshold (a fraction)
+    regressions = []
+    for name, stats in current['routes'].items():
+        old = baseline['routes'].get(name)
+        if not old:
+            continue
+        for metric in ('p50_ms', 'p99_ms', 'queries_per_request'):
+            if old.get(metric) and stats.get(metric) and stats[metric] > old[metric] * (1 + threshold):
+                regressions.append(f'{name} {metric}: {old[metric]} -> {stats[metric]}')
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark TaskTracker routes.')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--db', help='seeded SQLite file to benchmark in process with the Flask test client')
+    target.add_argument('--url', help='base URL of a running server seeded with benchmarks/seed.py')
+    parser.add_argument('--iterations', type=int, default=200, help='measured requests per route')
+    parser.add_argument('--warmup', type=int, default=10, help='unmeasured requests per route (per session over HTTP)')
+    parser.add_argument('--concurrency', type=int, default=4, help='parallel sessions when benchmarking over HTTP')
+    parser.add_argument('--output', help='write the report as JSON to this file')
+    parser.add_argument('--compare', help='previous JSON report to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown before a route counts as a regression (0.2 = 20%%)')
+    args = parser.parse_args(argv)
+    if args.db:
+        routes = runInProcess(args.db, args.iterations, args.warmup)
+        meta = {'mode': 'test-client', 'db': args.db}
+    else:
+        routes = runHttp(args.url, args.iterations, args.warmup, args.concurrency)
+        meta = {'mode': 'http', 'url': args.url, 'concurrency': args.concurrency}
+    report = {'meta': dict(meta, iterations=args.iterations, timestamp=datetime.now().isoformat(timespec='seconds')), 'routes': routes}
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    if args.compare:
+        with open(args.compare) as baselineFile:
+            regressions = compare(report, json.load(baselineFile), args.threshold)
+        for regression in regressions:
+            print('REGRESSION', regression, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
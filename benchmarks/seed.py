@@ -0,0 +1,81 @@
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+
+# Seed a TaskTracker database with synthetic data for benchmarking.
+# usage (from the repo root): python -m benchmarks.seed --db bench.db --scale 100k
+# every seeded user has the password 'benchmark'; user1 is the creator and admin of org1
+
+SCALES = { # tasks, users, organizations, organizations joined per user
+    '1k': (1000, 100, 10, 3),
+    '100k': (100000, 5000, 100, 5),
+    '1m': (1000000, 20000, 500, 5),
+}
+BENCH_PASSWORD = 'benchmark'
+BATCH_SIZE = 10000
+
+def useDatabase(path): # point the app at the benchmark database, must run before the app is imported
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.abspath(path)
+
+def batched(rows, size=BATCH_SIZE):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+def seed(taskCount, userCount, orgCount, orgsPerUser, randomSeed=1):
+    from flask import current_app
+    from flask_migrate import upgrade
+    from extensions import db, migrations
+    from models import User, Organization, Junction, Task, TaskDetail
+    from passwords import hashPassword
+    rng = random.Random(randomSeed)
+    migrations(current_app)
+    upgrade() # same schema and indexes as production
+    passwordHash = hashPassword(BENCH_PASSWORD) # hashed once with the configured method, hashing per user would dominate seeding time
+    users = [dict(id=i, username=f'user{i}', passwordHash=passwordHash, nameFirst='Bench', nameLast=f'User{i}', email=f'user{i}@example.com', about=f'Benchmark user {i}') for i in range(1, userCount + 1)]
+    orgs = [dict(id=i, name=f'org{i}', about=f'Benchmark organization {i}', address=f'{i} Benchmark Street', contactUserId=i) for i in range(1, orgCount + 1)]
+    members = {org['id']: {org['contactUserId']} for org in orgs} # org creator is always a member
+    for user in users:
+        for orgId in rng.sample(range(1, orgCount + 1), min(orgsPerUser, orgCount)):
+            members[orgId].add(user['id'])
+    junctions = [dict(organizationId=orgId, userId=userId, orgAdmin=userId == orgId) for orgId, userIds in members.items() for userId in userIds]
+    memberLists = {orgId: sorted(userIds) for orgId, userIds in members.items()}
+    tasks = []
+    details = []
+    now = datetime.now()
+    for taskId in range(1, taskCount + 1):
+        orgId = rng.randint(1, orgCount)
+        complete = rng.random() < 0.3
+        assignee = rng.choice(memberLists[orgId]) if complete or rng.random() < 0.6 else None
+        creator = rng.choice(memberLists[orgId])
+        tasks.append(dict(id=taskId, name=f'Task {taskId}', taskComplete=complete, organizationId=orgId, assignedToUserId=assignee))
+        details.append(dict(taskId=taskId, createdByUserId=creator, assignedByUserId=creator if assignee else None, dateComplete=now - timedelta(days=rng.randint(0, 90)) if complete else None, notes=f'Notes for task {taskId}'))
+    for table, rows in ((User.__table__, users), (Organization.__table__, orgs), (Junction.__table__, junctions), (Task.__table__, tasks), (TaskDetail.__table__, details)):
+        for batch in batched(rows):
+            db.session.execute(table.insert(), batch) # executemany, one statement per batch
+        db.session.commit()
+    return {'users': len(users), 'organizations': len(orgs), 'memberships': len(junctions), 'tasks': len(tasks)}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Seed a TaskTracker database with synthetic benchmark data.')
+    parser.add_argument('--db', required=True, help='SQLite file to create (must not exist yet)')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='1k')
+    parser.add_argument('--tasks', type=int, help='override the number of tasks for the chosen scale')
+    parser.add_argument('--seed', type=int, default=1, help='random seed, the same seed produces the same data')
+    args = parser.parse_args(argv)
+    if os.path.exists(args.db):
+        parser.error(f'{args.db} already exists')
+    taskCount, userCount, orgCount, orgsPerUser = SCALES[args.scale]
+    useDatabase(args.db)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from app import create_app
+    started = time.perf_counter()
+    with create_app().app_context():
+        counts = seed(args.tasks or taskCount, userCount, orgCount, orgsPerUser, args.seed)
+    print(f'Seeded {args.db} in {time.perf_counter() - started:.1f}s: {counts}')
+
+if __name__ == '__main__':
+    main()
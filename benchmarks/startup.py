@@ -0,0 +1,125 @@
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+
+# Process startup cost: how long a new worker, CLI call or test run takes before it can answer its first request.
+# Every run is a fresh interpreter started with `python -X importtime`, timing each phase and the modules it imported:
+#   import         import app (the factory and the extensions it needs)
+#   create_app     build the app and register the blueprints
+#   first_request  GET / through the test client
+#   first_form     GET /login, the first page with a form (loads Flask-WTF/WTForms)
+# usage (from the repo root): python -m benchmarks.startup --runs 5 --output startup.json
+# compare two runs for regressions:  python -m benchmarks.startup --compare startup.json
+
+PHASES = ['import', 'create_app', 'first_request', 'first_form']
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = '''
+import sys, time, json
+timings = {}
+def phase(name):
+    print('startup-phase: ' + name, file=sys.stderr, flush=True)
+    return time.perf_counter()
+started = phase('import')
+from app import create_app
+timings['import'] = time.perf_counter() - started
+started = phase('create_app')
+app = create_app()
+timings['create_app'] = time.perf_counter() - started
+client = app.test_client()
+started = phase('first_request')
+assert client.get('/').status_code == 200
+timings['first_request'] = time.perf_counter() - started
+started = phase('first_form')
+assert client.get('/login').status_code == 200
+timings['first_form'] = time.perf_counter() - started
+print(json.dumps(timings))
+'''
+
+IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+def parseImportTimes(stderr): # {phase: [(module, cumulative microseconds)]} for the top level imports of each phase
+    # the import phase is broken down by what app.py imports, the other phases by what the app imported lazily
+    phases = {name: [] for name in PHASES}
+    current = None
+    for line in stderr.splitlines():
+        if line.startswith('startup-phase: '):
+            current = line[len('startup-phase: '):]
+            continue
+        match = IMPORT_LINE.match(line)
+        if match and current and len(match.group(3)) == (3 if current == 'import' else 1): # nesting depth, 1 + 2 spaces per level
+            phases[current].append((match.group(4), int(match.group(2))))
+    return phases
+
+def runOnce(env):
+    started = time.perf_counter()
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE], cwd=ROOT, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    if process.returncode:
+        raise RuntimeError(f'startup probe failed:\n{process.stderr[-2000:]}')
+    timings = json.loads(process.stdout.strip().splitlines()[-1])
+    return wall, timings, parseImportTimes(process.stderr)
+
+def measure(runs, top, databaseUrl):
+    env = dict(os.environ, DATABASE_URL=databaseUrl, EVENT_WORKER_ENABLED='0')
+    runOnce(env) # warm the OS file cache and compile the .pyc files
+    walls, timings, imports = [], {name: [] for name in PHASES}, {name: {} for name in PHASES}
+    for i in range(runs):
+        wall, runTimings, runImports = runOnce(env)
+        walls.append(wall)
+        for name in PHASES:
+            timings[name].append(runTimings[name])
+            for module, micros in runImports[name]:
+                imports[name].setdefault(module, []).append(micros)
+    report = {'process_ms': round(statistics.median(walls) * 1000, 1), 'phases': {}}
+    for name in PHASES:
+        modules = sorted(((module, statistics.median(samples)) for module, samples in imports[name].items()), key=lambda item: -item[1])
+        report['phases'][name] = {
+            'median_ms': round(statistics.median(timings[name]) * 1000, 1),
+            'min_ms': round(min(timings[name]) * 1000, 1),
+            'imports_ms': round(sum(micros for module, micros in modules) / 1000, 1),
+            'top_imports_ms': {module: round(micros / 1000, 1) for module, micros in modules[:top]},
+        }
+    report['time_to_first_request_ms'] = round(sum(report['phases'][name]['median_ms'] for name in ('import', 'create_app', 'first_request')), 1)
+    return report
+
+def compare(current, baseline, threshold): # phases that got slower than baseline by more than threshold (a fraction)
+    regressions = []
+    for name, stats in current['phases'].items():
+        old = baseline['phases'].get(name)
+        if old and stats['median_ms'] > old['median_ms'] * (1 + threshold):
+            regressions.append(f"{name}: {old['median_ms']} -> {stats['median_ms']} ms")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure TaskTracker import time and time to first request.')
+    parser.add_argument('--runs', type=int, default=5, help='fresh processes measured, the report shows the median')
+    parser.add_argument('--top', type=int, default=8, help='slowest top level imports listed per phase')
+    parser.add_argument('--db', help='SQLite file to point the app at (default: an in memory database, startup does not read it)')
+    parser.add_argument('--output', help='write the report as JSON to this file')
+    parser.add_argument('--compare', help='previous JSON report to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown before a phase counts as a regression (0.2 = 20%%)')
+    args = parser.parse_args(argv)
+    databaseUrl = 'sqlite:///' + os.path.abspath(args.db) if args.db else 'sqlite://'
+    report = dict(measure(args.runs, args.top, databaseUrl), meta={'runs': args.runs, 'python': sys.version.split()[0], 'timestamp': datetime.now().isoformat(timespec='seconds')})
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    if args.compare:
+        with open(args.compare) as baselineFile:
+            regressions = compare(report, json.load(baselineFile), args.threshold)
+        for regression in regressions:
+            print('REGRESSION', regression, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
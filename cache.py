@@ -0,0 +1,102 @@
+import time
+import threading
+from collections import OrderedDict
+from flask import current_app, g, has_app_context
+
+
+# Small caching layer used for data that is read on nearly every request (logged in user, membership/admin bits).
+# Two levels: a per-request dict stored on flask.g (always on) and an optional process-wide LRU with TTL,
+# enabled by setting <NAME>_CACHE_TTL in the app config. Process-wide entries are only invalidated in the process
+# that made the change, so keep the TTL short when running several worker processes.
+
+class LRUCache: # thread safe least recently used cache with optional per entry time to live
+    def __init__(self, maxSize=1024, ttl=None):
+        self.maxSize = maxSize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or (self.ttl and entry[1] < time.monotonic()): # missing or expired
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl if self.ttl else None)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxSize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_processCaches = {} # cache name -> LRUCache, created on first use from app config
+_requestStats = {} # cache name -> [per-request hits, misses]
+_registryLock = threading.Lock()
+
+def processCache(name): # process-wide cache for name, None when <NAME>_CACHE_TTL is not set
+    ttl = current_app.config.get(f'{name.upper()}_CACHE_TTL')
+    if not ttl:
+        return None
+    cache = _processCaches.get(name)
+    if cache is None:
+        with _registryLock:
+            cache = _processCaches.setdefault(name, LRUCache(current_app.config.get(f'{name.upper()}_CACHE_SIZE', 1024), ttl))
+    return cache
+
+def requestCache(name): # dict that lives for the current request only
+    caches = g.setdefault('_requestCaches', {})
+    return caches.setdefault(name, {})
+
+def cached(name, key, loader):
+    # return value for key from the request cache, then the process cache, and only call loader() on a miss in both
+    stats = _requestStats.setdefault(name, [0, 0])
+    perRequest = requestCache(name)
+    if key in perRequest:
+        stats[0] += 1
+        return perRequest[key]
+    stats[1] += 1
+    shared = processCache(name)
+    value = shared.get(key) if shared is not None else None
+    if value is None:
+        value = loader()
+        if shared is not None and value is not None:
+            shared.set(key, value)
+    perRequest[key] = value
+    return value
+
+def invalidate(name, key): # drop key from both levels, call after any write that changes the cached value
+    if has_app_context():
+        requestCache(name).pop(key, None)
+    shared = _processCaches.get(name)
+    if shared is not None:
+        shared.delete(key)
+
+def stats(): # hit/miss counters for every cache, exposed on /cache/stats
+    result = {}
+    for name, (requestHits, requestMisses) in _requestStats.items():
+        result[name] = {'requestHits': requestHits, 'requestMisses': requestMisses}
+    for name, cache in _processCaches.items():
+        result.setdefault(name, {}).update({'processHits': cache.hits, 'processMisses': cache.misses, 'evictions': cache.evictions, 'size': len(cache)})
+    return result
@@ -0,0 +1,176 @@
+import click
+import sys
+import time
+from flask import Blueprint, current_app
+from extensions import db, migrations
+from models import Organization, User
+from maintenance import purgeCompletedTasks, archiveCompletedTasks, pruneEvents
+from counters import recomputeOrgCounts
+
+
+# flask CLI commands, run with e.g. `flask purge-completed-tasks --older-than 30`
+# registered as a blueprint without a group, so they stay top level commands
+
+commands = Blueprint('commands', __name__, cli_group=None)
+
+def organizationNamed(orgName): # Organization for an --org option, BadParameter if there is none
+    org = Organization.query.filter_by(name=orgName).first()
+    if not org:
+        raise click.BadParameter(f'No organization named {orgName}', param_hint='--org')
+    return org
+
+@commands.cli.command('purge-completed-tasks')
+@click.option('--org', 'orgName', help='Only purge tasks from this organization (default: every organization).')
+@click.option('--older-than', 'olderThanDays', type=click.IntRange(min=1), help='Only purge tasks completed more than this many days ago.')
+@click.option('--chunk-size', 'chunkSize', type=click.IntRange(min=1), default=None, help='Rows deleted per transaction.')
+def purgeCompletedTasksCommand(orgName, olderThanDays, chunkSize):
+    orgId = organizationNamed(orgName).id if orgName else None
+    removed = purgeCompletedTasks(orgId, olderThanDays, chunkSize or current_app.config['PURGE_CHUNK_SIZE'])
+    click.echo(f"Removed {removed['tasks']} completed tasks and {removed['details']} task detail rows")
+
+@commands.cli.command('archive-tasks')
+@click.option('--org', 'orgName', help='Only archive tasks from this organization (default: every organization).')
+@click.option('--older-than', 'olderThanDays', type=click.IntRange(min=0), default=None, help='Only archive tasks completed more than this many days ago (default: ARCHIVE_AFTER_DAYS, 0 for every completed task).')
+@click.option('--chunk-size', 'chunkSize', type=click.IntRange(min=1), default=None, help='Tasks moved per transaction.')
+@click.option('--every', 'everySeconds', type=click.IntRange(min=1), default=None, help='Keep running and archive again after this many seconds, e.g. as a dedicated process instead of cron.')
+def archiveTasksCommand(orgName, olderThanDays, chunkSize, everySeconds):
+    # move completed tasks from tasks/task_detail to archived_tasks so the live tables only hold current work
+    orgId = organizationNamed(orgName).id if orgName else None
+    olderThanDays = current_app.config['ARCHIVE_AFTER_DAYS'] if olderThanDays is None else olderThanDays
+    while True:
+        moved = archiveCompletedTasks(orgId, olderThanDays or None, chunkSize or current_app.config['PURGE_CHUNK_SIZE'])
+        click.echo(f"Archived {moved['archived']} completed tasks")
+        if not everySeconds:
+            break
+        time.sleep(everySeconds)
+
+@commands.cli.command('prune-events')
+@click.option('--older-than', 'olderThanDays', type=click.IntRange(min=0), default=None, help='Delete outbox events processed more than this many days ago (default: EVENT_RETENTION_DAYS).')
+@click.option('--activity-older-than', 'activityOlderThanDays', type=click.IntRange(min=0), default=None, help='Delete activity feed entries older than this many days (default: ACTIVITY_RETENTION_DAYS, 0 keeps them).')
+@click.option('--chunk-size', 'chunkSize', type=click.IntRange(min=1), default=None, help='Rows deleted per transaction.')
+@click.option('--every', 'everySeconds', type=click.IntRange(min=1), default=None, help='Keep running and prune again after this many seconds.')
+def pruneEventsCommand(olderThanDays, activityOlderThanDays, chunkSize, everySeconds):
+    # keep outbox_events and activity_entries from growing forever, the newest LIVE_REPLAY_LIMIT events stay for live board replay
+    config = current_app.config
+    olderThanDays = config['EVENT_RETENTION_DAYS'] if olderThanDays is None else olderThanDays
+    activityOlderThanDays = config['ACTIVITY_RETENTION_DAYS'] if activityOlderThanDays is None else activityOlderThanDays
+    while True:
+        removed = pruneEvents(olderThanDays, config['LIVE_REPLAY_LIMIT'], activityOlderThanDays or None, chunkSize or config['PURGE_CHUNK_SIZE'])
+        click.echo(f"Removed {removed['events']} outbox events and {removed['activity']} activity entries")
+        if not everySeconds:
+            break
+        time.sleep(everySeconds)
+
+@commands.cli.command('export-tasks')
+@click.option('--org', 'orgName', required=True, help='Organization whose tasks are exported.')
+@click.option('--format', 'format', type=click.Choice(['csv', 'jsonl']), default=None, help='Output format (default: from the output file name, else csv).')
+@click.option('--output', type=click.Path(dir_okay=False, writable=True), help='File to write (default: standard output).')
+def exportTasksCommand(orgName, format, output):
+    from transfer import exportTasks, detectFormat
+    org = organizationNamed(orgName)
+    format = format or detectFormat(output)
+    destination = open(output, 'w', newline='', encoding='utf-8') if output else sys.stdout
+    try:
+        for chunk in exportTasks(org.id, format, current_app.config['TRANSFER_BATCH_SIZE']):
+            destination.write(chunk)
+    finally:
+        if output:
+            destination.close()
+
+@commands.cli.command('import-tasks')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--org', 'orgName', required=True, help='Organization the tasks are added to.')
+@click.option('--user', 'username', help='Member recorded as the creator of rows without one, and as the importer in the activity feed.')
+@click.option('--format', 'format', type=click.Choice(['csv', 'jsonl']), default=None, help='Input format (default: from the file name, else csv).')
+@click.option('--batch-size', 'batchSize', type=click.IntRange(min=1), default=None, help='Rows inserted per transaction.')
+def importTasksCommand(path, orgName, username, format, batchSize):
+    from transfer import importTasks, detectFormat
+    org = organizationNamed(orgName)
+    actorId = None
+    if username:
+        user = User.query.filter_by(username=username).first()
+        if not user:
+            raise click.BadParameter(f'No user named {username}', param_hint='--user')
+        actorId = user.id
+    with open(path, newline='', encoding='utf-8-sig') as textFile:
+        result = importTasks(org.id, textFile, format or detectFormat(path), actorId, batchSize or current_app.config['TRANSFER_BATCH_SIZE'])
+    for error in result['errors']:
+        click.echo(error, err=True)
+    click.echo(f"Imported {result['imported']} tasks, skipped {result['skipped']} rows")
+
+@commands.cli.command('init-db')
+def initDbCommand(): # bring the schema up to the latest migration (same as `flask db upgrade`), existing data is left alone
+    from flask_migrate import upgrade
+    from search import installSearchIndex, rebuildSearchIndex
+    migrations(current_app)
+    upgrade()
+    if installSearchIndex(): # index rows that existed before the search index was added
+        rebuildSearchIndex()
+    click.echo('Database schema up to date')
+
+@commands.cli.command('recompute-task-counts')
+@click.option('--org', 'orgName', help='Only rebuild counters for this organization (default: every organization).')
+def recomputeTaskCountsCommand(orgName):
+    # repair the denormalized task counters from the tasks table, e.g. after editing the database by hand
+    query = Organization.query
+    if orgName:
+        query = query.filter_by(name=orgName)
+    orgIds = [org.id for org in query.with_entities(Organization.id)]
+    for orgId in orgIds:
+        recomputeOrgCounts(orgId)
+        db.session.commit()
+    click.echo(f'Recomputed task counters for {len(orgIds)} organizations')
+
+@commands.cli.command('search-rebuild')
+def searchRebuildCommand(): # reindex every user, organization and task for search
+    from search import installSearchIndex, rebuildSearchIndex
+    installSearchIndex()
+    rebuildSearchIndex()
+    click.echo('Search index rebuilt')
+
+@commands.cli.command('explain-queries')
+@click.option('--user', 'username', help='Run the pages as this user (default: any member of an organization with tasks).')
+@click.option('--path', 'paths', multiple=True, help='Only explain these paths, e.g. /organizations/tasks/{orgName} (repeatable).')
+@click.option('--all', 'showAll', is_flag=True, help='Print every plan, not just the ones with full scans or temporary b-trees.')
+def explainQueriesCommand(username, paths, showAll):
+    # print EXPLAIN QUERY PLAN for the SELECTs behind each read only page (SQLite only)
+    from queryplans import explainPages
+    if db.engine.dialect.name != 'sqlite':
+        raise click.UsageError('explain-queries only supports SQLite databases')
+    try:
+        values, plans = explainPages(username, list(paths) or None)
+    except ValueError as error:
+        raise click.ClickException(str(error))
+    click.echo(f"Sample user {values['username']}, organization {values['orgName']}, task {values['taskId']}")
+    flagged = 0
+    for plan in plans:
+        if plan.warnings:
+            flagged += 1
+        elif not showAll:
+            continue
+        click.echo(f'\n{plan.path}\n  {" ".join(plan.statement.split())}')
+        for line in plan.lines:
+            click.echo(f"  {'!!' if line in plan.warnings else '  '} {line}")
+    click.echo(f'\n{len(plans)} distinct queries, {flagged} with full scans or temporary b-trees')
+
+@commands.cli.command('process-events')
+@click.option('--once', is_flag=True, help='Process every pending event and exit instead of running until interrupted.')
+def processEventsCommand(once):
+    # consume the task event outbox in the foreground, e.g. as a dedicated process with EVENT_WORKER_ENABLED=0 on the web workers
+    from events import processBatch, EventWorker
+    if once:
+        total = 0
+        while True:
+            processed = processBatch(current_app.config)
+            total += processed
+            if processed < current_app.config['EVENT_BATCH_SIZE']:
+                break
+        click.echo(f'Processed {total} events')
+        return
+    worker = EventWorker(current_app._get_current_object())
+    worker.start()
+    try:
+        while worker.is_alive():
+            worker.join(1)
+    except KeyboardInterrupt:
+        worker.stop()
@@ -0,0 +1,87 @@
+from extensions import db
+from models import Task, OrganizationTaskCount, AssigneeTaskCount
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from responsecache import bumpAfterCommit
+
+
+# Denormalized per organization task counters (pending, completed, unassigned) and per assignee counters (pending, completed).
+# Every write that creates, assigns, completes, unassigns or deletes tasks must record the change with TaskCountDelta in the
+# same transaction. Counters are updated with relative upserts (INSERT ... ON CONFLICT DO UPDATE SET pending = pending + ...), so
+# concurrent requests never overwrite each other, and the first two writers for an organization or assignee can't both insert its row.
+# Every organization has a counter row (organizationRegistration creates it, migration 0006 backfilled older organizations).
+
+UPSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert} # dialects with INSERT ... ON CONFLICT
+
+def addCounts(model, keys, counts): # add counts to the counter row for keys, a missing row starts from zero
+    table = model.__table__
+    insert = UPSERTS.get(db.engine.dialect.name)
+    if insert is None: # no upsert, update and insert when nothing matched
+        if not db.session.execute(table.update().where(*[table.c[name] == value for name, value in keys.items()]).values({name: table.c[name] + value for name, value in counts.items()})).rowcount:
+            db.session.execute(table.insert().values(**keys, **counts))
+        return
+    statement = insert(table).values(**keys, **counts)
+    db.session.execute(statement.on_conflict_do_update(index_elements=list(keys), set_={name: table.c[name] + statement.excluded[name] for name in counts}))
+
+def contribution(state): # counters a single task in state (taskComplete, assignedToUserId) adds to, None for a task that doesn't exist
+    if state is None:
+        return (0, 0, 0), None, (0, 0)
+    complete, assigneeId = state
+    pending = 0 if complete else 1
+    return (pending, 1 - pending, pending if assigneeId is None else 0), assigneeId, (pending, 1 - pending)
+
+class TaskCountDelta: # accumulates counter changes for one organization, applied with one UPDATE per touched row
+    def __init__(self, orgId):
+        self.orgId = orgId
+        self.org = [0, 0, 0] # pending, completed, unassigned
+        self.assignees = {} # userId -> [pending, completed]
+
+    def change(self, old, new, count=1): # record count tasks moving from state old to state new (None = created/deleted)
+        for state, sign in ((old, -count), (new, count)):
+            orgCounts, assigneeId, assigneeCounts = contribution(state)
+            for i, value in enumerate(orgCounts):
+                self.org[i] += sign * value
+            if assigneeId is not None:
+                totals = self.assignees.setdefault(assigneeId, [0, 0])
+                totals[0] += sign * assigneeCounts[0]
+                totals[1] += sign * assigneeCounts[1]
+        return self
+
+    def apply(self):
+        if not any(self.org) and not any(any(totals) for totals in self.assignees.values()):
+            return
+        bumpAfterCommit(db.session, f'org:{self.orgId}') # cached organization pages show these counts
+        pending, completed, unassigned = self.org
+        addCounts(OrganizationTaskCount, dict(organizationId=self.orgId), dict(pending=pending, completed=completed, unassigned=unassigned))
+        for userId, (pending, completed) in self.assignees.items():
+            if pending or completed:
+                addCounts(AssigneeTaskCount, dict(organizationId=self.orgId, userId=userId), dict(pending=pending, completed=completed))
+
+def countTasks(orgId): # TaskCountDelta holding the organization's counters as counted from the tasks table
+    totals = TaskCountDelta(orgId)
+    for complete, assigneeId, count in db.session.query(Task.taskComplete, Task.assignedToUserId, func.count(Task.id)).filter(Task.organizationId == orgId).group_by(Task.taskComplete, Task.assignedToUserId):
+        totals.change(None, (bool(complete), assigneeId), count)
+    return totals
+
+def recomputeOrgCounts(orgId): # rebuild the counters for one organization from the tasks table, caller commits
+    totals = countTasks(orgId)
+    bumpAfterCommit(db.session, f'org:{orgId}')
+    OrganizationTaskCount.query.filter_by(organizationId=orgId).delete(synchronize_session=False)
+    AssigneeTaskCount.query.filter_by(organizationId=orgId).delete(synchronize_session=False)
+    db.session.execute(OrganizationTaskCount.__table__.insert().values(organizationId=orgId, pending=totals.org[0], completed=totals.org[1], unassigned=totals.org[2]))
+    assigneeRows = [dict(organizationId=orgId, userId=userId, pending=pending, completed=completed) for userId, (pending, completed) in totals.assignees.items()]
+    if assigneeRows:
+        db.session.execute(AssigneeTaskCount.__table__.insert(), assigneeRows)
+
+def orgTaskSummary(orgId): # OrganizationTaskCount for the org, read only (pages call this from GET requests)
+    summary = OrganizationTaskCount.query.get(orgId)
+    if summary is None: # only until migration 0006 has run, counted from the tasks table without saving
+        totals = countTasks(orgId)
+        summary = OrganizationTaskCount(organizationId=orgId, pending=totals.org[0], completed=totals.org[1], unassigned=totals.org[2])
+    return summary
+
+def assigneeCounts(orgId, userIds): # {userId: AssigneeTaskCount} for the given members of the org, members without tasks are left out
+    if not userIds:
+        return {}
+    rows = AssigneeTaskCount.query.filter(AssigneeTaskCount.organizationId == orgId, AssigneeTaskCount.userId.in_(userIds)).all()
+    return {row.userId: row for row in rows}
@@ -0,0 +1,179 @@
+import json
+import logging
+import threading
+import uuid
+import urllib.request
+from datetime import datetime, timedelta
+from sqlalchemy import event as sqlalchemyEvent, or_
+from extensions import db
+from models import OutboxEvent, ActivityEntry, User
+
+
+# Task event pipeline (transactional outbox).
+# publish() queues an event on the current session, and the events are inserted into outbox_events by the same commit
+# as the change they describe, so an event exists if and only if its change was committed.
+# A background EventWorker (one thread per worker process, started by wsgi.warmUp or `flask process-events`) claims pending
+# events in batches. It delivers them to the notifiers (webhook/email stand-ins), then writes the activity feed and marks
+# them processed in one transaction. A claim expires after EVENT_CLAIM_SECONDS, so events claimed by a process that died,
+# or whose notifier failed, are picked up again. Notifiers may therefore see an event more than once. Activity entries are
+# replaced on reprocessing.
+
+logger = logging.getLogger('tasktracker.events')
+
+def publish(kind, organizationId, taskId=None, actorUserId=None, subjectUserId=None, **payload):
+    # queue an event for the current transaction, written to the outbox when the session commits (nothing if it rolls back)
+    db.session.info.setdefault('outboxEvents', []).append(dict(kind=kind, organizationId=organizationId, taskId=taskId, actorUserId=actorUserId,
+        subjectUserId=subjectUserId, payload=json.dumps(payload) if payload else None, createdAt=datetime.now(), attempts=0))
+
+@sqlalchemyEvent.listens_for(db.session, 'before_commit')
+def writeOutbox(session):
+    rows = session.info.pop('outboxEvents', None)
+    if rows:
+        session.execute(OutboxEvent.__table__.insert(), rows) # one executemany for every event in the transaction
+        session.info['outboxWritten'] = True
+
+commitListeners = [] # functions called after a commit that wrote events, e.g. live.py wakes its broker
+
+@sqlalchemyEvent.listens_for(db.session, 'after_commit')
+def wakeWorker(session):
+    if session.info.pop('outboxWritten', False):
+        if _worker is not None:
+            _worker.wakeUp.set() # process new events now rather than at the next poll
+        for listener in commitListeners:
+            listener()
+
+@sqlalchemyEvent.listens_for(db.session, 'after_soft_rollback')
+def dropOutbox(session, previousTransaction):
+    session.info.pop('outboxEvents', None)
+    session.info.pop('outboxWritten', None)
+
+
+# activity feed
+
+def taskLabel(event, payload):
+    return payload.get('taskName') or f'task #{event.taskId}'
+
+SUMMARIES = { # kind -> function(event, payload, names) returning the activity text
+    'task.created': lambda event, payload, names: f"{names.get(event.actorUserId, 'someone')} created {taskLabel(event, payload)}",
+    'task.assigned': lambda event, payload, names: f"{names.get(event.actorUserId, 'someone')} assigned {taskLabel(event, payload)} to {names.get(event.subjectUserId, 'someone')}",
+    'task.completed': lambda event, payload, names: f"{names.get(event.actorUserId, 'someone')} completed {taskLabel(event, payload)}",
+    'task.unassigned': lambda event, payload, names: f"{taskLabel(event, payload)} was unassigned from {names.get(event.subjectUserId, 'someone')}",
+    'tasks.cleared': lambda event, payload, names: f"{names.get(event.actorUserId, 'An admin')} cleared {payload.get('count', 0)} completed tasks",
+    'tasks.archived': lambda event, payload, names: f"{names.get(event.actorUserId, 'The archive job')} archived {payload.get('count', 0)} completed tasks",
+    'tasks.imported': lambda event, payload, names: f"{names.get(event.actorUserId, 'An admin')} imported {payload.get('count', 0)} tasks",
+    'member.joined': lambda event, payload, names: f"{names.get(event.actorUserId, 'someone')} joined the organization",
+    'member.left': lambda event, payload, names: f"{names.get(event.actorUserId, 'someone')} left the organization",
+}
+
+def writeActivity(events): # organization feed entry plus one entry per involved user for each event, caller commits
+    userIds = {userId for event in events for userId in (event.actorUserId, event.subjectUserId) if userId is not None}
+    names = dict(db.session.query(User.id, User.username).filter(User.id.in_(userIds))) if userIds else {}
+    ActivityEntry.query.filter(ActivityEntry.eventId.in_([event.id for event in events])).delete(synchronize_session=False) # reprocessed events
+    rows = []
+    for event in events:
+        summarize = SUMMARIES.get(event.kind)
+        if summarize is None:
+            continue
+        summary = summarize(event, json.loads(event.payload or '{}'), names)[:255]
+        for userId in [None] + sorted({event.actorUserId, event.subjectUserId} - {None}):
+            rows.append(dict(eventId=event.id, organizationId=event.organizationId, userId=userId, kind=event.kind, taskId=event.taskId, summary=summary, createdAt=event.createdAt))
+    if rows:
+        db.session.execute(ActivityEntry.__table__.insert(), rows)
+
+
+# notifiers, called with each event before it is marked processed, an exception leaves the event for a later retry
+
+def eventJson(event):
+    return dict(id=event.id, kind=event.kind, organizationId=event.organizationId, taskId=event.taskId, actorUserId=event.actorUserId,
+        subjectUserId=event.subjectUserId, createdAt=event.createdAt.isoformat(), **json.loads(event.payload or '{}'))
+
+def webhookNotifier(config, event): # POST the event as JSON to EVENT_WEBHOOK_URL
+    if not config['EVENT_WEBHOOK_URL']:
+        return
+    request = urllib.request.Request(config['EVENT_WEBHOOK_URL'], data=json.dumps(eventJson(event)).encode(), headers={'Content-Type': 'application/json'}, method='POST')
+    with urllib.request.urlopen(request, timeout=config['EVENT_WEBHOOK_TIMEOUT']) as response:
+        response.read()
+
+def emailNotifier(config, event): # stand-in for assignment emails, logs what would be sent
+    if config['EVENT_EMAIL_ENABLED'] and event.kind == 'task.assigned' and event.subjectUserId != event.actorUserId:
+        logger.info('email to user %s: %s', event.subjectUserId, json.loads(event.payload or '{}').get('taskName'))
+
+notifiers = [webhookNotifier, emailNotifier]
+
+
+# consuming the outbox
+
+def claimEvents(batchSize, claimSeconds): # claim up to batchSize pending events for this call, returns them oldest first
+    token = uuid.uuid4().hex
+    now = datetime.now()
+    claimable = [OutboxEvent.processedAt.is_(None), or_(OutboxEvent.claimedAt.is_(None), OutboxEvent.claimedAt < now - timedelta(seconds=claimSeconds))]
+    pending = db.session.query(OutboxEvent.id).filter(*claimable).order_by(OutboxEvent.id).limit(batchSize)
+    # conditions repeated on the update so an event claimed by another process in the meantime is skipped
+    OutboxEvent.query.filter(OutboxEvent.id.in_(pending.scalar_subquery()), *claimable).update({OutboxEvent.claimToken: token, OutboxEvent.claimedAt: now}, synchronize_session=False)
+    db.session.commit()
+    return OutboxEvent.query.filter_by(claimToken=token).order_by(OutboxEvent.id).all()
+
+def processBatch(config):
+    events = claimEvents(config['EVENT_BATCH_SIZE'], config['EVENT_CLAIM_SECONDS'])
+    if not events:
+        return 0
+    failed = {}
+    for event in events:
+        for notifier in notifiers:
+            try:
+                notifier(config, event)
+            except Exception as error:
+                failed[event.id] = repr(error)[:1000]
+                break
+    done = [event for event in events if event.id not in failed or event.attempts + 1 >= config['EVENT_MAX_ATTEMPTS']]
+    writeActivity(done)
+    doneIds = {event.id for event in done}
+    now = datetime.now()
+    for event in events:
+        event.attempts += 1
+        event.lastError = failed.get(event.id)
+        if event.id in doneIds:
+            event.processedAt = now # events that keep failing are given up on after EVENT_MAX_ATTEMPTS, lastError says why
+        else:
+            logger.warning('event %s (%s) failed, retrying after the claim expires: %s', event.id, event.kind, failed[event.id])
+    db.session.commit()
+    return len(events)
+
+class EventWorker(threading.Thread): # processes the outbox in the background until stopped
+    def __init__(self, app):
+        super().__init__(name='event-worker', daemon=True)
+        self.app = app
+        self.wakeUp = threading.Event()
+        self.stopping = threading.Event()
+
+    def run(self):
+        while not self.stopping.is_set():
+            processed = 0
+            try:
+                with self.app.app_context():
+                    processed = processBatch(self.app.config)
+            except Exception:
+                logger.exception('processing the event outbox failed')
+            if processed < self.app.config['EVENT_BATCH_SIZE']: # caught up, sleep until new events are committed or the poll interval passes
+                self.wakeUp.wait(self.app.config['EVENT_POLL_SECONDS'])
+                self.wakeUp.clear()
+
+    def stop(self, timeout=None): # finish the current batch and exit
+        self.stopping.set()
+        self.wakeUp.set()
+        self.join(timeout)
+
+_worker = None
+
+def startEventWorker(app):
+    global _worker
+    if _worker is None or not _worker.is_alive():
+        _worker = EventWorker(app)
+        _worker.start()
+    return _worker
+
+def stopEventWorker(timeout=10):
+    global _worker
+    if _worker is not None:
+        _worker.stop(timeout)
+        _worker = None
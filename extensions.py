@@ -0,0 +1,20 @@
+import os
+from flask_sqlalchemy import SQLAlchemy
+from flask_login import LoginManager
+
+
+# Flask extensions, created unbound and attached to the app by create_app() (see app.py), so models and services can
+# import them without importing the app.
+
+db = SQLAlchemy()
+
+loginManager = LoginManager()
+loginManager.login_view = 'users.login' #default route for @login_required
+
+MIGRATIONS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+def migrations(app): # Flask-Migrate for the app, set up on first use because only the CLI needs it and importing alembic is slow
+    if 'migrate' not in app.extensions:
+        from flask_migrate import Migrate
+        Migrate(app, db, directory=MIGRATIONS_DIRECTORY, render_as_batch=True) #schema changes go through `flask db upgrade` (see migrations/)
+    return app.extensions['migrate']
@@ -1,8 +1,9 @@
-from app import db
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileRequired, FileAllowed
 from wtforms import StringField, TextAreaField, IntegerField, PasswordField, BooleanField, SelectField, SubmitField
-from wtforms.validators import DataRequired, InputRequired, Email, EqualTo, ValidationError
-from models import Junction, User, Organization
+from wtforms.validators import DataRequired, InputRequired, Email, EqualTo, ValidationError, Optional, NumberRange
+from models import User, Organization
+from membership import isMember
 
 
 class UserRegistrationForm(FlaskForm):
@@ -58,8 +59,7 @@ class GrantAdminForm(FlaskForm):
     submit = SubmitField('Grant Organization Admin Rights')
 
     def checkUserId(self, org, newAdminUserId):
-        newAdminUserObject = db.session.query(User, Organization).filter(Junction.userId == User.id, Junction.organizationId == Organization.id).filter(Organization.id == org.id).filter(User.id == newAdminUserId).first()
-        if newAdminUserObject:
+        if isMember(newAdminUserId, org.id):
             return True
         else:
             raise ValidationError()
@@ -83,6 +83,18 @@ class TaskCompletionForm(FlaskForm):
     completed = BooleanField('Mark task as completed')
     submit = SubmitField('Complete Task')
 
+class SearchForm(FlaskForm): # submitted with GET so results pages can be linked, no CSRF token needed
+    class Meta:
+        csrf = False
+    q = StringField('Search', validators=[InputRequired()])
+    kind = SelectField('Show', choices=[('', 'Everything'), ('task', 'Tasks'), ('user', 'Users'), ('organization', 'Organizations'), ('archivedTask', 'Archived tasks')], default='')
+    submit = SubmitField('Search')
+
 class ClearCompletedTasksForm(FlaskForm):
     clearTasks = BooleanField("Clear completed tasks from this organization's records")
-    submit = SubmitField('Clear Tasks')
\ No newline at end of file
+    olderThanDays = IntegerField('Only clear tasks completed more than this many days ago (leave blank to clear all)', validators=[Optional(), NumberRange(min=1)])
+    submit = SubmitField('Clear Tasks')
+
+class TaskImportForm(FlaskForm): # bulk task import for org admins, see transfer.py for the accepted columns
+    file = FileField('CSV or JSONL file', validators=[FileRequired(), FileAllowed(['csv', 'jsonl', 'ndjson', 'json'], 'Upload a .csv or .jsonl file')])
+    submit = SubmitField('Import Tasks')
@@ -0,0 +1,28 @@
+import multiprocessing
+import os
+
+
+# gunicorn settings, every value can be overridden with an environment variable
+# start: gunicorn -c gunicorn.conf.py wsgi:app
+# graceful reload (new code/config, in flight requests finish first): kill -HUP <master pid>
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1)) # worker processes
+threads = int(os.environ.get('GUNICORN_THREADS', 4)) # threads per worker process
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread') # 'gevent' (pip install gevent) serves live task board streams from greenlets and turns them on by default (see config.py)
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30)) # seconds before a stuck worker is killed and restarted
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30)) # seconds workers get to finish requests on reload/shutdown
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000)) # recycle workers periodically to cap memory growth
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100)) # so workers don't all restart at once
+preload_app = False # import the app in each worker after fork rather than in the master
+accesslog = '-'
+errorlog = '-'
+
+def post_worker_init(worker): # runs in each worker once the app has been imported
+    from wsgi import warmUp
+    warmUp()
+
+def worker_exit(server, worker): # let the event worker finish its current batch, unfinished claims are retried by other workers anyway
+    from events import stopEventWorker
+    stopEventWorker()
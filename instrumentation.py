@@ -0,0 +1,139 @@
+import hmac
+import logging
+import threading
+import time
+from flask import Response, abort, g, has_request_context, has_app_context, current_app, request
+from flask.signals import before_render_template, template_rendered, signals_available
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import cache
+
+
+# Request level instrumentation: SQL query count and time (SQLAlchemy engine events), template render time (Flask signals)
+# and wall time per route, recorded for every view without touching the views themselves.
+# Served in Prometheus text format on /metrics and optionally as a Server-Timing response header.
+# Metrics are kept per worker process, so with several gunicorn workers each scrape reports the worker that answered it.
+
+logger = logging.getLogger('tasktracker.sql')
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0) # seconds, histogram upper bounds
+
+class RouteMetrics: # thread safe per endpoint counters
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.routes = {}
+        self.slowQueries = 0
+
+    def record(self, endpoint, status, wall, queries, sqlSeconds, renderSeconds):
+        with self._lock:
+            route = self.routes.get(endpoint)
+            if route is None:
+                route = self.routes[endpoint] = {'statuses': {}, 'queries': 0, 'sql': 0.0, 'render': 0.0, 'wall': 0.0, 'count': 0, 'buckets': [0] * len(DURATION_BUCKETS)}
+            route['statuses'][status] = route['statuses'].get(status, 0) + 1
+            route['queries'] += queries
+            route['sql'] += sqlSeconds
+            route['render'] += renderSeconds
+            route['wall'] += wall
+            route['count'] += 1
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if wall <= bound:
+                    route['buckets'][i] += 1
+
+    def prometheusText(self):
+        lines = []
+        def metric(name, kind, helpText, samples):
+            lines.append(f'# HELP {name} {helpText}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(samples)
+        with self._lock:
+            routes = sorted(self.routes.items())
+            metric('tasktracker_requests_total', 'counter', 'Requests handled per endpoint and status code.',
+                [f'tasktracker_requests_total{{endpoint="{name}",status="{status}"}} {count}' for name, route in routes for status, count in sorted(route['statuses'].items())])
+            metric('tasktracker_sql_queries_total', 'counter', 'SQL statements executed per endpoint.',
+                [f'tasktracker_sql_queries_total{{endpoint="{name}"}} {route["queries"]}' for name, route in routes])
+            metric('tasktracker_sql_seconds_total', 'counter', 'Time spent executing SQL per endpoint.',
+                [f'tasktracker_sql_seconds_total{{endpoint="{name}"}} {route["sql"]:.6f}' for name, route in routes])
+            metric('tasktracker_render_seconds_total', 'counter', 'Time spent rendering templates per endpoint.',
+                [f'tasktracker_render_seconds_total{{endpoint="{name}"}} {route["render"]:.6f}' for name, route in routes])
+            histogram = []
+            for name, route in routes:
+                for bound, count in zip(DURATION_BUCKETS, route['buckets']):
+                    histogram.append(f'tasktracker_request_duration_seconds_bucket{{endpoint="{name}",le="{bound}"}} {count}')
+                histogram.append(f'tasktracker_request_duration_seconds_bucket{{endpoint="{name}",le="+Inf"}} {route["count"]}')
+                histogram.append(f'tasktracker_request_duration_seconds_sum{{endpoint="{name}"}} {route["wall"]:.6f}')
+                histogram.append(f'tasktracker_request_duration_seconds_count{{endpoint="{name}"}} {route["count"]}')
+            metric('tasktracker_request_duration_seconds', 'histogram', 'Wall time per request.', histogram)
+            metric('tasktracker_slow_queries_total', 'counter', 'SQL statements slower than SLOW_QUERY_MS.', [f'tasktracker_slow_queries_total {self.slowQueries}'])
+        cacheSamples = []
+        for name, counters in sorted(cache.stats().items()):
+            for counter, value in sorted(counters.items()):
+                cacheSamples.append(f'tasktracker_cache{{cache="{name}",counter="{counter}"}} {value}')
+        metric('tasktracker_cache', 'gauge', 'User and membership cache counters (see /cache/stats).', cacheSamples)
+        return '\n'.join(lines) + '\n'
+
+metrics = RouteMetrics()
+
+# SQL timing listens on every engine, so it is installed once per process however many apps create_app() builds
+@event.listens_for(Engine, 'before_cursor_execute')
+def startQueryTimer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('queryStartTimes', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def stopQueryTimer(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['queryStartTimes'].pop()
+    if has_request_context() and 'requestStart' in g:
+        g.queryCount += 1
+        g.sqlSeconds += elapsed
+    slowQuerySeconds = current_app.config['SLOW_QUERY_MS'] / 1000 if has_app_context() else 0
+    if slowQuerySeconds and elapsed >= slowQuerySeconds:
+        metrics.slowQueries += 1
+        logger.warning('slow query (%.1f ms) on %s: %s', elapsed * 1000, request.endpoint if has_request_context() else 'no request', statement)
+
+@event.listens_for(Engine, 'handle_error')
+def dropQueryTimer(context): # a failed statement never reaches after_cursor_execute, don't leave its start time on the pooled connection
+    startTimes = context.connection.info.get('queryStartTimes') if context.connection is not None and context.execution_context is not None else None
+    if startTimes:
+        startTimes.pop()
+
+def instrument(app):
+    if signals_available: # template timing needs blinker, everything else works without it
+        def startRenderTimer(sender, template, context, **extra):
+            if 'requestStart' in g:
+                g.renderStart = time.perf_counter()
+
+        def stopRenderTimer(sender, template, context, **extra):
+            if 'renderStart' in g:
+                g.renderSeconds += time.perf_counter() - g.pop('renderStart')
+
+        before_render_template.connect(startRenderTimer, app, weak=False)
+        template_rendered.connect(stopRenderTimer, app, weak=False)
+
+    @app.before_request
+    def startRequestTimer():
+        g.requestStart = time.perf_counter()
+        g.queryCount = 0
+        g.sqlSeconds = 0.0
+        g.renderSeconds = 0.0
+
+    @app.after_request
+    def recordRequest(response):
+        if 'requestStart' not in g:
+            return response
+        wall = time.perf_counter() - g.requestStart
+        metrics.record(request.endpoint or 'unmatched', response.status_code, wall, g.queryCount, g.sqlSeconds, g.renderSeconds)
+        if app.config['SERVER_TIMING_HEADER']:
+            response.headers['Server-Timing'] = (f'sql;dur={g.sqlSeconds * 1000:.2f};desc="{g.queryCount} queries", '
+                f'render;dur={g.renderSeconds * 1000:.2f}, total;dur={wall * 1000:.2f}')
+        return response
+
+    if app.config['METRICS_ENABLED']:
+        @app.route('/metrics')
+        def prometheusMetrics():
+            # scrapers send METRICS_TOKEN as a bearer token, without one configured only the host itself (e.g. a local agent) is answered
+            token = app.config['METRICS_TOKEN']
+            if token:
+                if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+                    abort(404)
+            elif request.remote_addr not in ('127.0.0.1', '::1'):
+                abort(404)
+            return Response(metrics.prometheusText(), mimetype='text/plain; version=0.0.4')
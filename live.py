@@ -0,0 +1,175 @@
+import json
+import queue
+import threading
+import time
+from flask import current_app
+from extensions import db
+from models import OutboxEvent, OrganizationTaskCount, User
+from events import commitListeners
+
+
+# Live task board updates over Server-Sent Events.
+# The outbox (see events.py) doubles as the broker: it is shared by every worker process, and events get increasing ids.
+# One LiveBroker thread per worker process tails outbox_events by id while someone is subscribed. It turns new events
+# into board deltas (task fields, usernames, current organization counts) and fans them out to the subscribed streams.
+# Each stream holds a worker thread (gthread) or a greenlet (GUNICORN_WORKER_CLASS=gevent) for as long as the browser is
+# connected. The board page opens its stream from the newest event id at render time, and reconnects with Last-Event-ID
+# after the stream is closed at LIVE_MAX_STREAM_SECONDS, so nothing committed after the page was rendered is missed.
+# Tailing by id relies on ids becoming visible in order. SQLite serializes writers, so they do. PostgreSQL assigns ids at insert
+# time, and a lower id can commit after a higher one and be skipped, so live updates are only supported on SQLite.
+
+BOARD_EVENTS = ('task.created', 'task.assigned', 'task.completed', 'task.unassigned', 'tasks.cleared', 'tasks.archived', 'tasks.imported') # tasks.imported only updates the counts
+RELOAD = object() # sent to a subscriber that fell too far behind, the page should reload instead of applying deltas
+
+def boardDeltas(events): # JSON ready deltas for outbox events, resolving usernames and current counters in one query each
+    events = [event for event in events if event.kind in BOARD_EVENTS]
+    if not events:
+        return []
+    userIds = {userId for event in events for userId in (event.actorUserId, event.subjectUserId) if userId is not None}
+    names = dict(db.session.query(User.id, User.username).filter(User.id.in_(userIds))) if userIds else {}
+    counts = {row.organizationId: dict(pending=row.pending, unassigned=row.unassigned, completed=row.completed)
+        for row in OrganizationTaskCount.query.filter(OrganizationTaskCount.organizationId.in_({event.organizationId for event in events}))}
+    deltas = []
+    for event in events:
+        payload = json.loads(event.payload or '{}')
+        delta = dict(id=event.id, kind=event.kind, organizationId=event.organizationId, taskId=event.taskId, taskName=payload.get('taskName'),
+            actorUserId=event.actorUserId, subjectUserId=event.subjectUserId, subjectName=names.get(event.subjectUserId), counts=counts.get(event.organizationId))
+        if event.kind in ('tasks.cleared', 'tasks.archived'):
+            delta['taskIds'] = payload.get('taskIds', [])
+        deltas.append(delta)
+    return deltas
+
+def latestEventId(): # position a newly rendered board starts streaming from
+    return db.session.query(db.func.max(OutboxEvent.id)).scalar() or 0
+
+def recentDeltas(orgId, afterId, limit): # board deltas for the organization newer than afterId, for reconnecting browsers
+    oldestId = db.session.query(db.func.min(OutboxEvent.id)).scalar()
+    if afterId and (oldestId is None or oldestId > afterId): # the last event the browser saw was pruned, so may the ones after it (see maintenance.pruneEvents)
+        return None
+    events = OutboxEvent.query.filter(OutboxEvent.organizationId == orgId, OutboxEvent.id > afterId, OutboxEvent.kind.in_(BOARD_EVENTS)).order_by(OutboxEvent.id).limit(limit + 1).all()
+    if len(events) > limit:
+        return None # too far behind, reload the page
+    return boardDeltas(events)
+
+class LiveBroker(threading.Thread):
+    def __init__(self, app):
+        super().__init__(name='live-broker', daemon=True)
+        self.app = app
+        self.subscribers = {} # orgId -> set of queue.Queue
+        self.lock = threading.Lock()
+        self.wakeUp = threading.Event()
+        self.lastId = None
+        self.startId = None # oldest position a subscriber asked for while the broker wasn't tailing
+
+    def subscribe(self, orgId, afterId=None): # afterId: the stream has (or replays) every event up to this id
+        subscription = queue.Queue(maxsize=self.app.config['LIVE_QUEUE_SIZE'])
+        with self.lock:
+            self.subscribers.setdefault(orgId, set()).add(subscription)
+            if self.lastId is None and afterId is not None: # tail from there rather than from whatever is newest at the next poll
+                self.startId = afterId if self.startId is None else min(self.startId, afterId)
+        self.wakeUp.set()
+        return subscription
+
+    def streamCount(self): # streams open on this worker process
+        with self.lock:
+            return sum(len(subscriptions) for subscriptions in self.subscribers.values())
+
+    def unsubscribe(self, orgId, subscription):
+        with self.lock:
+            subscriptions = self.subscribers.get(orgId)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self.subscribers[orgId]
+
+    def publish(self, delta):
+        with self.lock:
+            subscriptions = list(self.subscribers.get(delta['organizationId'], ()))
+        for subscription in subscriptions:
+            try:
+                subscription.put_nowait(delta)
+            except queue.Full: # slow client, stop sending it deltas and tell it to reload
+                self.unsubscribe(delta['organizationId'], subscription)
+                while True:
+                    try:
+                        subscription.get_nowait()
+                    except queue.Empty:
+                        break
+                subscription.put_nowait(RELOAD)
+
+    def poll(self):
+        with self.lock:
+            if not self.subscribers:
+                self.lastId = None # nobody listening, start again when someone subscribes
+                return
+            if self.lastId is None:
+                self.lastId, self.startId = self.startId, None
+        if self.lastId is None: # only streams without a position, start from the newest event
+            self.lastId = latestEventId()
+            return
+        events = OutboxEvent.query.filter(OutboxEvent.id > self.lastId).order_by(OutboxEvent.id).limit(1000).all()
+        if events:
+            self.lastId = events[-1].id
+            for delta in boardDeltas([event for event in events if event.organizationId in self.subscribers]):
+                self.publish(delta)
+
+    def run(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    self.poll()
+            except Exception:
+                self.app.logger.exception('polling the event outbox for live updates failed')
+            self.wakeUp.wait(self.app.config['LIVE_POLL_SECONDS'] if self.subscribers else None)
+            self.wakeUp.clear()
+
+_broker = None
+_brokerLock = threading.Lock()
+
+def liveBroker(): # broker for this worker process, started on first use
+    global _broker
+    with _brokerLock:
+        if _broker is None or not _broker.is_alive():
+            _broker = LiveBroker(current_app._get_current_object())
+            _broker.start()
+    return _broker
+
+def wakeBroker(): # events committed by this process are streamed right away, other processes' within LIVE_POLL_SECONDS
+    if _broker is not None:
+        _broker.wakeUp.set()
+
+commitListeners.append(wakeBroker)
+
+def eventStream(orgId, lastEventId=None):
+    # generator of SSE messages for the organization's board, served until the browser disconnects or the stream times out
+    config = current_app.config
+    broker = liveBroker()
+    subscription = broker.subscribe(orgId, lastEventId) # subscribe before replaying so no event falls between the two
+    try:
+        yield f"retry: {config['LIVE_RETRY_MS']}\n\n"
+        lastSent = lastEventId or 0
+        if lastEventId is not None:
+            replay = recentDeltas(orgId, lastEventId, config['LIVE_REPLAY_LIMIT'])
+            if replay is None:
+                yield 'event: reload\ndata: {}\n\n'
+                return
+            for delta in replay:
+                lastSent = delta['id']
+                yield f'id: {delta["id"]}\ndata: {json.dumps(delta)}\n\n'
+        db.session.remove() # don't hold a pooled connection for the life of the stream
+        closeAt = time.monotonic() + config['LIVE_MAX_STREAM_SECONDS']
+        while time.monotonic() < closeAt:
+            try:
+                delta = subscription.get(timeout=config['LIVE_HEARTBEAT_SECONDS'])
+            except queue.Empty:
+                yield ': keepalive\n\n' # also how a disconnected browser is noticed
+                continue
+            if delta is RELOAD:
+                yield 'event: reload\ndata: {}\n\n'
+                return
+            if delta['id'] <= lastSent: # already sent while replaying
+                continue
+            lastSent = delta['id']
+            yield f'id: {delta["id"]}\ndata: {json.dumps(delta)}\n\n'
+    finally:
+        broker.unsubscribe(orgId, subscription)
@@ -0,0 +1,87 @@
+from extensions import db
+from models import Task, TaskDetail, ArchivedTask, OutboxEvent, ActivityEntry
+from counters import TaskCountDelta
+from events import publish
+from sqlalchemy import func, select, literal
+from datetime import datetime, timedelta
+
+
+# Set based clean up jobs. Rows are removed with DELETE ... WHERE id IN (...) statements in fixed size chunks,
+# committing after every chunk so the SQLite write lock is released regularly and other requests can write in between.
+
+def completedTaskIds(orgId=None, cutoff=None, limit=500): # ids of the oldest completed tasks, optionally only those completed before cutoff
+    query = db.session.query(Task.id).filter(Task.taskComplete == True)
+    if orgId is not None:
+        query = query.filter(Task.organizationId == orgId)
+    if cutoff is not None:
+        query = query.join(TaskDetail, TaskDetail.taskId == Task.id).filter(TaskDetail.dateComplete < cutoff)
+    return [row.id for row in query.order_by(Task.id).limit(limit)]
+
+def archiveRows(taskIds, archivedAt): # copy tasks and their details into archived_tasks with one INSERT ... SELECT
+    columns = ['id', 'organizationId', 'name', 'assignedToUserId', 'createdByUserId', 'assignedByUserId', 'dateComplete', 'notes', 'archivedAt']
+    rows = (select(Task.id, Task.organizationId, Task.name, Task.assignedToUserId, TaskDetail.createdByUserId, TaskDetail.assignedByUserId, TaskDetail.dateComplete, TaskDetail.notes, literal(archivedAt))
+        .outerjoin(TaskDetail, TaskDetail.taskId == Task.id).where(Task.id.in_(taskIds)))
+    return db.session.execute(ArchivedTask.__table__.insert().from_select(columns, rows)).rowcount
+
+def purgeCompletedTasks(orgId=None, olderThanDays=None, chunkSize=500, actorId=None, archive=False):
+    # delete completed tasks and their task_detail rows, returns counts of removed rows
+    # with archive the tasks are copied to archived_tasks in the same transaction first (see archiveCompletedTasks)
+    # actorId is the user who asked for the purge, recorded on the tasks.cleared/tasks.archived events (None when run from the CLI)
+    cutoff = datetime.now() - timedelta(days=olderThanDays) if olderThanDays else None
+    removed = {'tasks': 0, 'details': 0, 'archived': 0}
+    while True:
+        taskIds = completedTaskIds(orgId, cutoff, chunkSize)
+        if not taskIds:
+            break
+        # count what is being removed per org and assignee so the task counters stay exact
+        countDeltas = {}
+        clearedPerOrg = {}
+        for taskOrgId, assigneeId, count in db.session.query(Task.organizationId, Task.assignedToUserId, func.count(Task.id)).filter(Task.id.in_(taskIds)).group_by(Task.organizationId, Task.assignedToUserId):
+            countDeltas.setdefault(taskOrgId, TaskCountDelta(taskOrgId)).change((True, assigneeId), None, count)
+        for taskId, taskOrgId in db.session.query(Task.id, Task.organizationId).filter(Task.id.in_(taskIds)): # ids go on the event for live task boards
+            clearedPerOrg.setdefault(taskOrgId, []).append(taskId)
+        if archive:
+            removed['archived'] += archiveRows(taskIds, datetime.now())
+        # details first so the tasks they reference are never missing, no ORM objects are loaded for either table
+        removed['details'] += TaskDetail.query.filter(TaskDetail.taskId.in_(taskIds)).delete(synchronize_session=False)
+        removed['tasks'] += Task.query.filter(Task.id.in_(taskIds)).delete(synchronize_session=False)
+        for countDelta in countDeltas.values():
+            countDelta.apply()
+        for taskOrgId, clearedIds in clearedPerOrg.items(): # one event per organization and chunk, not per task
+            publish('tasks.archived' if archive else 'tasks.cleared', taskOrgId, actorUserId=actorId, count=len(clearedIds), taskIds=clearedIds)
+        db.session.commit()
+        if len(taskIds) < chunkSize:
+            break
+    return removed
+
+def archiveCompletedTasks(orgId=None, olderThanDays=None, chunkSize=500, actorId=None):
+    # move completed tasks to archived_tasks so tasks only holds live work, their history stays browsable and searchable
+    return purgeCompletedTasks(orgId, olderThanDays, chunkSize, actorId, archive=True)
+
+def deleteChunks(model, condition, chunkSize): # delete the rows matching condition, oldest first, returns how many
+    removed = 0
+    while True:
+        ids = [row.id for row in db.session.query(model.id).filter(condition).order_by(model.id).limit(chunkSize)]
+        if not ids:
+            break
+        removed += model.query.filter(model.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        if len(ids) < chunkSize:
+            break
+    return removed
+
+def pruneEvents(olderThanDays, keepLatest, activityOlderThanDays=None, chunkSize=500):
+    # delete outbox events processed more than olderThanDays days ago, always keeping the newest keepLatest events for live board replay.
+    # Only a prefix of the outbox is removed, so a browser whose last event is gone knows it missed something (see live.recentDeltas).
+    # Activity feed entries are kept unless activityOlderThanDays is given
+    removed = {'events': 0, 'activity': 0}
+    cutoff = datetime.now() - timedelta(days=olderThanDays)
+    keepFrom = db.session.query(OutboxEvent.id).order_by(OutboxEvent.id.desc()).offset(max(keepLatest - 1, 0)).limit(1).scalar()
+    recentFrom = db.session.query(func.min(OutboxEvent.id)).filter((OutboxEvent.processedAt == None) | (OutboxEvent.processedAt >= cutoff)).scalar()
+    boundary = min(id for id in (keepFrom, recentFrom) if id is not None) if keepFrom is not None else None
+    if boundary is not None:
+        removed['events'] = deleteChunks(OutboxEvent, OutboxEvent.id < boundary, chunkSize)
+    if activityOlderThanDays is not None:
+        activityCutoff = datetime.now() - timedelta(days=activityOlderThanDays)
+        removed['activity'] = deleteChunks(ActivityEntry, ActivityEntry.createdAt < activityCutoff, chunkSize)
+    return removed
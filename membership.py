@@ -0,0 +1,40 @@
+from extensions import db
+from models import User, Junction
+from queries import keysetPage
+from cache import cached, invalidate
+from responsecache import bumpVersions
+
+
+# Membership service. Answers "is this user a member/admin of this organization" with a single primary key lookup
+# on the junction table, and lists members together with their admin flag in one joined query.
+# Member/admin bits are cached (see cache.py), so every route that adds, removes or changes a Junction row
+# must call invalidateMembership for that user and organization (after committing).
+
+def getMembership(userId, orgId): # Junction object for the user and organization, None if the user is not a member
+    return Junction.query.get((orgId, userId))
+
+def membershipStatus(userId, orgId): # cached (isMember, isAdmin) tuple for the user and organization
+    def load():
+        membership = getMembership(userId, orgId)
+        return (membership is not None, membership is not None and membership.orgAdmin)
+    return cached('membership', (userId, orgId), load)
+
+def isMember(userId, orgId):
+    return membershipStatus(userId, orgId)[0]
+
+def isAdmin(userId, orgId):
+    return membershipStatus(userId, orgId)[1]
+
+def invalidateMembership(userId, orgId):
+    invalidate('membership', (userId, orgId))
+    bumpVersions(f'org:{orgId}') # cached organization pages show join/leave and admin links
+
+def orgMembersWithAdmin(orgId, **pageArgs): # page of (User object, orgAdmin boolean) rows for every member of the organization
+    query = db.session.query(User, Junction.orgAdmin).join(Junction, Junction.userId == User.id).filter(Junction.organizationId == orgId)
+    return keysetPage(query, Junction.userId, cursor=lambda row: row[0].id, **pageArgs) # same values as User.id, but ordered by the junction primary key so no sort is needed
+
+def userMemberships(userId): # {orgId: orgAdmin} for every organization the user belongs to, one query for batch permission checks
+    return dict(db.session.query(Junction.organizationId, Junction.orgAdmin).filter(Junction.userId == userId).all())
+
+def orgMemberUsers(orgId): # every User object in the organization, used for task assignment choices
+    return User.query.join(Junction, Junction.userId == User.id).filter(Junction.organizationId == orgId).order_by(Junction.userId).all()
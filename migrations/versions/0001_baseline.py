@@ -0,0 +1,158 @@
+"""baseline schema: users, organizations, memberships, tasks, task counters and search index
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 12:00:00
+
+Databases created before migrations existed already have some or all of these tables,
+so every table, index and trigger is only created when it is missing.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+SEARCH_SCHEMA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(title, body, kind UNINDEXED, refId UNINDEXED, orgId UNINDEXED, tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER IF NOT EXISTS search_users_insert AFTER INSERT ON users BEGIN
+        INSERT INTO search_index(rowid, title, body, kind, refId, orgId) VALUES (new.id * 4 + 1, new.username, new.nameFirst || ' ' || new.nameLast || ' ' || coalesce(new.about, ''), 'user', new.id, NULL);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_users_update AFTER UPDATE OF username, nameFirst, nameLast, about ON users BEGIN
+        UPDATE search_index SET title = new.username, body = new.nameFirst || ' ' || new.nameLast || ' ' || coalesce(new.about, '') WHERE rowid = new.id * 4 + 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_users_delete AFTER DELETE ON users BEGIN
+        DELETE FROM search_index WHERE rowid = old.id * 4 + 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_organizations_insert AFTER INSERT ON organizations BEGIN
+        INSERT INTO search_index(rowid, title, body, kind, refId, orgId) VALUES (new.id * 4 + 2, new.name, coalesce(new.about, '') || ' ' || new.address, 'organization', new.id, new.id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_organizations_update AFTER UPDATE OF name, about, address ON organizations BEGIN
+        UPDATE search_index SET title = new.name, body = coalesce(new.about, '') || ' ' || new.address WHERE rowid = new.id * 4 + 2;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_organizations_delete AFTER DELETE ON organizations BEGIN
+        DELETE FROM search_index WHERE rowid = old.id * 4 + 2;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_tasks_insert AFTER INSERT ON tasks BEGIN
+        INSERT INTO search_index(rowid, title, body, kind, refId, orgId) VALUES (new.id * 4 + 3, new.name, coalesce((SELECT notes FROM task_detail WHERE taskId = new.id), ''), 'task', new.id, new.organizationId);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_tasks_update AFTER UPDATE OF name, organizationId ON tasks BEGIN
+        UPDATE search_index SET title = new.name, orgId = new.organizationId WHERE rowid = new.id * 4 + 3;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_tasks_delete AFTER DELETE ON tasks BEGIN
+        DELETE FROM search_index WHERE rowid = old.id * 4 + 3;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_task_detail_insert AFTER INSERT ON task_detail BEGIN
+        UPDATE search_index SET body = coalesce(new.notes, '') WHERE rowid = new.taskId * 4 + 3;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_task_detail_update AFTER UPDATE OF notes ON task_detail BEGIN
+        UPDATE search_index SET body = coalesce(new.notes, '') WHERE rowid = new.taskId * 4 + 3;
+    END""",
+]
+
+SEARCH_BACKFILL = [
+    """INSERT INTO search_index(rowid, title, body, kind, refId, orgId)
+        SELECT id * 4 + 1, username, nameFirst || ' ' || nameLast || ' ' || coalesce(about, ''), 'user', id, NULL FROM users""",
+    """INSERT INTO search_index(rowid, title, body, kind, refId, orgId)
+        SELECT id * 4 + 2, name, coalesce(about, '') || ' ' || address, 'organization', id, id FROM organizations""",
+    """INSERT INTO search_index(rowid, title, body, kind, refId, orgId)
+        SELECT tasks.id * 4 + 3, tasks.name, coalesce(task_detail.notes, ''), 'task', tasks.id, tasks.organizationId FROM tasks LEFT JOIN task_detail ON task_detail.taskId = tasks.id""",
+]
+
+
+def upgrade():
+    bind = op.get_bind()
+    existing = set(sa.inspect(bind).get_table_names())
+
+    def createTable(name, *columns, indexes=()): # table plus its indexes, skipped when the table already exists
+        if name in existing:
+            return
+        op.create_table(name, *columns)
+        for indexName, indexColumns, unique in indexes:
+            op.create_index(indexName, name, indexColumns, unique=unique)
+
+    createTable('users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(length=45), nullable=False),
+        sa.Column('passwordHash', sa.String(length=128), nullable=False),
+        sa.Column('nameFirst', sa.String(length=45), nullable=False),
+        sa.Column('nameLast', sa.String(length=45), nullable=False),
+        sa.Column('email', sa.String(length=45), nullable=False),
+        sa.Column('about', sa.Text(length=255), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        indexes=[('ix_users_username', ['username'], True), ('ix_users_email', ['email'], True), ('ix_users_nameFirst', ['nameFirst'], False),
+            ('ix_users_nameLast', ['nameLast'], False), ('ix_users_about', ['about'], False)])
+    createTable('organizations',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=45), nullable=False),
+        sa.Column('about', sa.Text(length=255), nullable=True),
+        sa.Column('address', sa.Text(length=255), nullable=False),
+        sa.Column('contactUserId', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        indexes=[('ix_organizations_name', ['name'], True), ('ix_organizations_about', ['about'], False), ('ix_organizations_address', ['address'], False),
+            ('ix_organizations_contactUserId', ['contactUserId'], False)])
+    createTable('organization_user_junction',
+        sa.Column('organizationId', sa.Integer(), nullable=False),
+        sa.Column('userId', sa.Integer(), nullable=False),
+        sa.Column('orgAdmin', sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(['organizationId'], ['organizations.id']),
+        sa.ForeignKeyConstraint(['userId'], ['users.id']),
+        sa.PrimaryKeyConstraint('organizationId', 'userId'),
+        indexes=[('ix_organization_user_junction_orgAdmin', ['orgAdmin'], False)])
+    createTable('tasks',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=45), nullable=False),
+        sa.Column('taskComplete', sa.Boolean(), nullable=False),
+        sa.Column('organizationId', sa.Integer(), nullable=False),
+        sa.Column('assignedToUserId', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['organizationId'], ['organizations.id']),
+        sa.ForeignKeyConstraint(['assignedToUserId'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+        indexes=[('ix_tasks_name', ['name'], False), ('ix_tasks_taskComplete', ['taskComplete'], False), ('ix_tasks_organizationId', ['organizationId'], False),
+            ('ix_tasks_assignedToUserId', ['assignedToUserId'], False)])
+    createTable('task_detail',
+        sa.Column('taskId', sa.Integer(), nullable=False),
+        sa.Column('createdByUserId', sa.Integer(), nullable=False),
+        sa.Column('assignedByUserId', sa.Integer(), nullable=True),
+        sa.Column('dateComplete', sa.DateTime(), nullable=True),
+        sa.Column('notes', sa.Text(length=255), nullable=True),
+        sa.ForeignKeyConstraint(['taskId'], ['tasks.id']),
+        sa.PrimaryKeyConstraint('taskId'),
+        indexes=[('ix_task_detail_taskId', ['taskId'], False), ('ix_task_detail_createdByUserId', ['createdByUserId'], False),
+            ('ix_task_detail_assignedByUserId', ['assignedByUserId'], False), ('ix_task_detail_dateComplete', ['dateComplete'], False),
+            ('ix_task_detail_notes', ['notes'], False)])
+    createTable('organization_task_counts',
+        sa.Column('organizationId', sa.Integer(), nullable=False),
+        sa.Column('pending', sa.Integer(), nullable=False),
+        sa.Column('completed', sa.Integer(), nullable=False),
+        sa.Column('unassigned', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['organizationId'], ['organizations.id']),
+        sa.PrimaryKeyConstraint('organizationId'))
+    createTable('assignee_task_counts',
+        sa.Column('organizationId', sa.Integer(), nullable=False),
+        sa.Column('userId', sa.Integer(), nullable=False),
+        sa.Column('pending', sa.Integer(), nullable=False),
+        sa.Column('completed', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['organizationId'], ['organizations.id']),
+        sa.ForeignKeyConstraint(['userId'], ['users.id']),
+        sa.PrimaryKeyConstraint('organizationId', 'userId'))
+
+    if bind.dialect.name == 'sqlite': # full text search index, other databases use the LIKE fallback in search.py
+        newIndex = 'search_index' not in existing
+        for statement in SEARCH_SCHEMA:
+            op.execute(statement)
+        if newIndex:
+            for statement in SEARCH_BACKFILL:
+                op.execute(statement)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute('DROP TABLE IF EXISTS search_index')
+    for name in ('assignee_task_counts', 'organization_task_counts', 'task_detail', 'tasks', 'organization_user_junction', 'organizations', 'users'):
+        op.drop_table(name)
@@ -0,0 +1,72 @@
+"""replace single column indexes with composite indexes for the real query shapes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 12:30:00
+
+Indexes on booleans, free text and columns no query filters on only slowed down writes. The composites serve:
+  organization task board                          (organizationId, id)
+  completed task purges and counter rebuilds       (organizationId, taskComplete, assignedToUserId)
+  unassigning a member's tasks when they leave     (organizationId, assignedToUserId)
+  user task list                                   (assignedToUserId, id)
+  organizations a user belongs to                  (userId, organizationId, orgAdmin)
+Use `flask explain-queries` to check the plans each route gets.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+DROPPED = [ # (index, table, columns) as created by the baseline
+    ('ix_users_nameFirst', 'users', ['nameFirst']),
+    ('ix_users_nameLast', 'users', ['nameLast']),
+    ('ix_users_about', 'users', ['about']),
+    ('ix_organizations_about', 'organizations', ['about']),
+    ('ix_organizations_address', 'organizations', ['address']),
+    ('ix_organizations_contactUserId', 'organizations', ['contactUserId']),
+    ('ix_organization_user_junction_orgAdmin', 'organization_user_junction', ['orgAdmin']),
+    ('ix_tasks_name', 'tasks', ['name']),
+    ('ix_tasks_taskComplete', 'tasks', ['taskComplete']),
+    ('ix_tasks_organizationId', 'tasks', ['organizationId']),
+    ('ix_tasks_assignedToUserId', 'tasks', ['assignedToUserId']),
+    ('ix_task_detail_taskId', 'task_detail', ['taskId']),
+    ('ix_task_detail_createdByUserId', 'task_detail', ['createdByUserId']),
+    ('ix_task_detail_assignedByUserId', 'task_detail', ['assignedByUserId']),
+    ('ix_task_detail_dateComplete', 'task_detail', ['dateComplete']),
+    ('ix_task_detail_notes', 'task_detail', ['notes']),
+]
+
+CREATED = [
+    ('ix_tasks_organizationId_id', 'tasks', ['organizationId', 'id']),
+    ('ix_tasks_organizationId_taskComplete_assignedToUserId', 'tasks', ['organizationId', 'taskComplete', 'assignedToUserId']),
+    ('ix_tasks_organizationId_assignedToUserId', 'tasks', ['organizationId', 'assignedToUserId']),
+    ('ix_tasks_assignedToUserId_id', 'tasks', ['assignedToUserId', 'id']),
+    ('ix_organization_user_junction_userId_organizationId', 'organization_user_junction', ['userId', 'organizationId', 'orgAdmin']),
+]
+
+
+def existingIndexes(table):
+    return {index['name'] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    for name, table, columns in DROPPED:
+        if name in existingIndexes(table):
+            op.drop_index(name, table_name=table)
+    for name, table, columns in CREATED:
+        op.create_index(name, table, columns, unique=False)
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute('ANALYZE') # give the query planner statistics for the new indexes
+
+
+def downgrade():
+    for name, table, columns in CREATED:
+        op.drop_index(name, table_name=table)
+    for name, table, columns in DROPPED:
+        op.create_index(name, table, columns, unique=False)
@@ -0,0 +1,53 @@
+"""task event outbox and activity feed tables
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 14:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('outbox_events',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=30), nullable=False),
+        sa.Column('organizationId', sa.Integer(), nullable=False),
+        sa.Column('taskId', sa.Integer(), nullable=True),
+        sa.Column('actorUserId', sa.Integer(), nullable=True),
+        sa.Column('subjectUserId', sa.Integer(), nullable=True),
+        sa.Column('payload', sa.Text(), nullable=True),
+        sa.Column('createdAt', sa.DateTime(), nullable=False),
+        sa.Column('claimToken', sa.String(length=32), nullable=True),
+        sa.Column('claimedAt', sa.DateTime(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('lastError', sa.Text(), nullable=True),
+        sa.Column('processedAt', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'))
+    op.create_index('ix_outbox_events_processedAt_id', 'outbox_events', ['processedAt', 'id'], unique=False)
+    op.create_table('activity_entries',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('eventId', sa.Integer(), nullable=False),
+        sa.Column('organizationId', sa.Integer(), nullable=False),
+        sa.Column('userId', sa.Integer(), nullable=True),
+        sa.Column('kind', sa.String(length=30), nullable=False),
+        sa.Column('taskId', sa.Integer(), nullable=True),
+        sa.Column('summary', sa.String(length=255), nullable=False),
+        sa.Column('createdAt', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'))
+    op.create_index('ix_activity_entries_organizationId_userId_id', 'activity_entries', ['organizationId', 'userId', 'id'], unique=False)
+    op.create_index('ix_activity_entries_userId_id', 'activity_entries', ['userId', 'id'], unique=False)
+    op.create_index('ix_activity_entries_eventId', 'activity_entries', ['eventId'], unique=False)
+
+
+def downgrade():
+    op.drop_table('activity_entries')
+    op.drop_table('outbox_events')
@@ -0,0 +1,48 @@
+"""archive table for completed tasks
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 19:30:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+SEARCH_TRIGGERS = [ # archived tasks are indexed with kind code 0 (rowid id * 4), same statements as search.py
+    """CREATE TRIGGER IF NOT EXISTS search_archived_tasks_insert AFTER INSERT ON archived_tasks BEGIN
+        INSERT INTO search_index(rowid, title, body, kind, refId, orgId) VALUES (new.id * 4, new.name, coalesce(new.notes, ''), 'archivedTask', new.id, new.organizationId);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_archived_tasks_delete AFTER DELETE ON archived_tasks BEGIN
+        DELETE FROM search_index WHERE rowid = old.id * 4;
+    END""",
+]
+
+
+def upgrade():
+    op.create_table('archived_tasks',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('organizationId', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=45), nullable=False),
+        sa.Column('assignedToUserId', sa.Integer(), nullable=True),
+        sa.Column('createdByUserId', sa.Integer(), nullable=True),
+        sa.Column('assignedByUserId', sa.Integer(), nullable=True),
+        sa.Column('dateComplete', sa.DateTime(), nullable=True),
+        sa.Column('notes', sa.Text(length=255), nullable=True),
+        sa.Column('archivedAt', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'))
+    op.create_index('ix_archived_tasks_organizationId_id', 'archived_tasks', ['organizationId', 'id'], unique=False)
+    if op.get_bind().dialect.name == 'sqlite': # full text search index created by 0001, other databases use the LIKE fallback
+        for statement in SEARCH_TRIGGERS:
+            op.execute(statement)
+
+
+def downgrade():
+    op.drop_table('archived_tasks')
@@ -0,0 +1,55 @@
+"""never reuse task ids
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 10:00:00
+
+Archived tasks keep the id they had in the tasks table, and old /tasks/details/<id> links redirect to the archive.
+SQLite reuses the highest rowid once it is deleted unless the table is declared AUTOINCREMENT, so a new task could get
+the id of a task that was just archived. Rebuild tasks as AUTOINCREMENT and start its sequence above every id handed
+out so far, live or archived. Other databases use sequences, which never go backwards.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+TASK_TRIGGERS = [ # dropped with the old table, same statements as search.py
+    """CREATE TRIGGER IF NOT EXISTS search_tasks_insert AFTER INSERT ON tasks BEGIN
+        INSERT INTO search_index(rowid, title, body, kind, refId, orgId) VALUES (new.id * 4 + 3, new.name, coalesce((SELECT notes FROM task_detail WHERE taskId = new.id), ''), 'task', new.id, new.organizationId);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_tasks_update AFTER UPDATE OF name, organizationId ON tasks BEGIN
+        UPDATE search_index SET title = new.name, orgId = new.organizationId WHERE rowid = new.id * 4 + 3;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_tasks_delete AFTER DELETE ON tasks BEGIN
+        DELETE FROM search_index WHERE rowid = old.id * 4 + 3;
+    END""",
+]
+
+
+def rebuildTasks(autoincrement):
+    with op.batch_alter_table('tasks', recreate='always', table_kwargs={'sqlite_autoincrement': autoincrement}) as batch:
+        pass
+    for statement in TASK_TRIGGERS:
+        op.execute(statement)
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    rebuildTasks(True)
+    op.execute("DELETE FROM sqlite_sequence WHERE name = 'tasks'")
+    op.execute("""INSERT INTO sqlite_sequence(name, seq) VALUES ('tasks', max(
+        coalesce((SELECT max(id) FROM tasks), 0), coalesce((SELECT max(id) FROM archived_tasks), 0)))""")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    rebuildTasks(False)
@@ -0,0 +1,49 @@
+"""task counters for every organization
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-20 09:00:00
+
+Organizations created before the task counters existed have no organization_task_counts row. Counter changes are now
+upserts that start a missing row from zero, so compute those rows (and their assignee rows) from the tasks table once here.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+organizations = sa.table('organizations', sa.column('id'))
+tasks = sa.table('tasks', sa.column('id'), sa.column('organizationId'), sa.column('taskComplete', sa.Boolean()), sa.column('assignedToUserId'))
+orgCounts = sa.table('organization_task_counts', sa.column('organizationId'), sa.column('pending'), sa.column('completed'), sa.column('unassigned'))
+assigneeCounts = sa.table('assignee_task_counts', sa.column('organizationId'), sa.column('userId'), sa.column('pending'), sa.column('completed'))
+
+
+def countWhere(condition):
+    return sa.func.count(sa.case((condition, tasks.c.id)))
+
+
+def upgrade():
+    missing = sa.select(organizations.c.id).where(~sa.exists().where(orgCounts.c.organizationId == organizations.c.id))
+    orgIds = [row.id for row in op.get_bind().execute(missing)]
+    if not orgIds:
+        return
+    pending, completed = tasks.c.taskComplete == sa.false(), tasks.c.taskComplete == sa.true()
+    op.execute(assigneeCounts.delete().where(assigneeCounts.c.organizationId.in_(orgIds)))
+    op.execute(orgCounts.insert().from_select(['organizationId', 'pending', 'completed', 'unassigned'],
+        sa.select(organizations.c.id, countWhere(pending), countWhere(completed), countWhere(sa.and_(pending, tasks.c.assignedToUserId.is_(None))))
+        .select_from(organizations.outerjoin(tasks, tasks.c.organizationId == organizations.c.id))
+        .where(organizations.c.id.in_(orgIds)).group_by(organizations.c.id)))
+    op.execute(assigneeCounts.insert().from_select(['organizationId', 'userId', 'pending', 'completed'],
+        sa.select(tasks.c.organizationId, tasks.c.assignedToUserId, countWhere(pending), countWhere(completed))
+        .where(tasks.c.organizationId.in_(orgIds), tasks.c.assignedToUserId.isnot(None))
+        .group_by(tasks.c.organizationId, tasks.c.assignedToUserId)))
+
+
+def downgrade():
+    pass # the rows are valid counters either way
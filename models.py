@@ -1,6 +1,9 @@
-from app import db, loginManager
-from werkzeug.security import generate_password_hash, check_password_hash
+from extensions import db, loginManager
 from flask_login import UserMixin
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from cache import processCache
+from passwords import hashPassword, verifyPassword
 
 
 #create database models
@@ -9,36 +12,51 @@ class User(db.Model, UserMixin):
     id = db.Column(db.Integer(), primary_key=True)
     username = db.Column(db.String(45), index=True, unique=True, nullable=False)
     passwordHash = db.Column(db.String(128), nullable=False)
-    nameFirst = db.Column(db.String(45), index=True, nullable=False)
-    nameLast = db.Column(db.String(45), index=True, nullable=False)
+    nameFirst = db.Column(db.String(45), nullable=False)
+    nameLast = db.Column(db.String(45), nullable=False)
     email = db.Column(db.String(45), index=True, unique=True, nullable=False)
-    about = db.Column(db.Text(255), index=True)
+    about = db.Column(db.Text(255))
     organizations = db.relationship('Organization', secondary='organization_user_junction', back_populates='users', lazy='dynamic', cascade='all') #set relationship to junction table foreign key
     tasks = db.relationship('Task', backref='user', lazy='dynamic')
 
     def __repr__(self):
         return f"User object for {self.username}"
 
-    # User class functions to manage password hashing
+    # User class functions to manage password hashing (method, cost and process pool are configured in passwords.py)
     def set_pw_hash(self, password):
-        self.passwordHash = generate_password_hash(password)
+        self.passwordHash = hashPassword(password)
 
     def check_pw_hash(self, password):
-        return check_password_hash(self.passwordHash, password)
+        return verifyPassword(self.passwordHash, password)
+
+    def snapshot(self): # detached copy of the user's column values that can be cached between requests
+        copy = User(**{attr.key: getattr(self, attr.key) for attr in inspect(User).column_attrs})
+        make_transient_to_detached(copy)
+        return copy
 
 @loginManager.user_loader #load user for login manager
 def load_user(id):
-    return User.query.get(int(id))
+    userCache = processCache('user') # None unless USER_CACHE_TTL is configured
+    if userCache is None:
+        return User.query.get(int(id))
+    snapshot = userCache.get(int(id))
+    if snapshot is not None:
+        return db.session.merge(snapshot, load=False) # attach the cached copy to this request's session without a SELECT
+    user = User.query.get(int(id))
+    if user:
+        userCache.set(user.id, user.snapshot())
+    return user
 
 class Organization(db.Model):
     __tablename__ = 'organizations'
     id = db.Column(db.Integer(), primary_key=True)
     name = db.Column(db.String(45), index=True, unique=True, nullable=False)
-    about = db.Column(db.Text(255), index=True)
-    address = db.Column(db.Text(255), index=True, nullable=False)
-    contactUserId = db.Column(db.Integer(), index=True, nullable=False)
+    about = db.Column(db.Text(255))
+    address = db.Column(db.Text(255), nullable=False)
+    contactUserId = db.Column(db.Integer(), nullable=False)
     users = db.relationship('User', secondary='organization_user_junction', back_populates='organizations', lazy='dynamic', cascade='all') #set relationship to junction table
     tasks = db.relationship('Task', backref='organization', lazy='dynamic', cascade='all, delete-orphan')
+    contact = db.relationship('User', primaryjoin='User.id == foreign(Organization.contactUserId)', viewonly=True) #loaded on first access, so a cached profile fragment skips the query
 
     def __repr__(self):
         return f"Organization object for {self.name}"
@@ -48,7 +66,9 @@ class Junction(db.Model):
     __tablename__ = 'organization_user_junction'
     organizationId = db.Column(db.Integer(), db.ForeignKey('organizations.id'), primary_key=True)
     userId = db.Column(db.Integer(), db.ForeignKey('users.id'), primary_key=True)
-    orgAdmin = db.Column(db.Boolean(), index=True, nullable=False, default=False)
+    orgAdmin = db.Column(db.Boolean(), nullable=False, default=False)
+    # the primary key covers lookups by organization, this covers "which organizations is this user in (and admin of)"
+    __table_args__ = (db.Index('ix_organization_user_junction_userId_organizationId', 'userId', 'organizationId', 'orgAdmin'),)
 
     def __repr__(self):
         return f"Junction object for user ID {self.userId}, org ID {self.organizationId}"
@@ -56,22 +76,114 @@ class Junction(db.Model):
 class Task(db.Model):
     __tablename__ = 'tasks'
     id = db.Column(db.Integer(), primary_key=True)
-    name = db.Column(db.String(45), index=True, nullable=False)
-    taskComplete = db.Column(db.Boolean(), default=False, nullable=False, index=True)
-    organizationId = db.Column(db.Integer(), db.ForeignKey('organizations.id'), nullable=False, index=True)
-    assignedToUserId = db.Column(db.Integer(), db.ForeignKey('users.id'), index=True)
-    details = db.relationship('TaskDetail', backref='task', lazy='dynamic', cascade='all, delete-orphan')
+    name = db.Column(db.String(45), nullable=False)
+    taskComplete = db.Column(db.Boolean(), default=False, nullable=False)
+    organizationId = db.Column(db.Integer(), db.ForeignKey('organizations.id'), nullable=False)
+    assignedToUserId = db.Column(db.Integer(), db.ForeignKey('users.id'))
+    detail = db.relationship('TaskDetail', backref='task', uselist=False, cascade='all, delete-orphan') #one to one, loadable with joinedload() unlike a dynamic query
+    # composite indexes matching the task queries (see migrations/versions/0002_composite_indexes.py)
+    __table_args__ = (
+        db.Index('ix_tasks_organizationId_id', 'organizationId', 'id'), # organization task board, keyset paginated by id
+        db.Index('ix_tasks_organizationId_taskComplete_assignedToUserId', 'organizationId', 'taskComplete', 'assignedToUserId'), # completed task purge, covers the counter rebuild GROUP BY
+        db.Index('ix_tasks_organizationId_assignedToUserId', 'organizationId', 'assignedToUserId'), # unassigning tasks when a member leaves
+        db.Index('ix_tasks_assignedToUserId_id', 'assignedToUserId', 'id'), # user task list, keyset paginated by id
+        {'sqlite_autoincrement': True}, # ids are never reused, archived tasks keep theirs (see migrations/versions/0005_task_autoincrement.py)
+    )
 
     def __repr__(self):
         return f"Task object for {self.name}, task ID {self.id}"
 
 class TaskDetail(db.Model):
     __tablename__ = 'task_detail'
-    taskId = db.Column(db.Integer(), db.ForeignKey('tasks.id'), primary_key=True, index=True)
-    createdByUserId = db.Column(db.Integer(), nullable=False, index=True)
-    assignedByUserId = db.Column(db.Integer(), index=True)
-    dateComplete = db.Column(db.DateTime(), index=True)
-    notes = db.Column(db.Text(255), index=True)
+    taskId = db.Column(db.Integer(), db.ForeignKey('tasks.id'), primary_key=True)
+    createdByUserId = db.Column(db.Integer(), nullable=False)
+    assignedByUserId = db.Column(db.Integer())
+    dateComplete = db.Column(db.DateTime())
+    notes = db.Column(db.Text(255))
+    # view only relationships so task creator and assignor can be eager loaded with the task (user ID columns have no foreign key)
+    createdBy = db.relationship('User', primaryjoin='User.id == foreign(TaskDetail.createdByUserId)', viewonly=True)
+    assignedBy = db.relationship('User', primaryjoin='User.id == foreign(TaskDetail.assignedByUserId)', viewonly=True)
+
+    def __repr__(self):
+        return f"TaskDetail object for task ID {self.taskId}"
+
+# completed tasks moved out of tasks/task_detail by maintenance.archiveCompletedTasks, one compact read only row per task
+class ArchivedTask(db.Model):
+    __tablename__ = 'archived_tasks'
+    id = db.Column(db.Integer(), primary_key=True, autoincrement=False) #the task's id from the tasks table, which never hands it out again
+    organizationId = db.Column(db.Integer(), nullable=False)
+    name = db.Column(db.String(45), nullable=False)
+    assignedToUserId = db.Column(db.Integer())
+    createdByUserId = db.Column(db.Integer())
+    assignedByUserId = db.Column(db.Integer())
+    dateComplete = db.Column(db.DateTime())
+    notes = db.Column(db.Text(255))
+    archivedAt = db.Column(db.DateTime(), nullable=False)
+    assignedTo = db.relationship('User', primaryjoin='User.id == foreign(ArchivedTask.assignedToUserId)', viewonly=True)
+    createdBy = db.relationship('User', primaryjoin='User.id == foreign(ArchivedTask.createdByUserId)', viewonly=True)
+    assignedBy = db.relationship('User', primaryjoin='User.id == foreign(ArchivedTask.assignedByUserId)', viewonly=True)
+    __table_args__ = (db.Index('ix_archived_tasks_organizationId_id', 'organizationId', 'id'),) # organization archive, newest first
+
+    def __repr__(self):
+        return f"ArchivedTask object for {self.name}, task ID {self.id}"
+
+# denormalized task counters kept up to date by counters.py so summaries don't need to scan the tasks table
+class OrganizationTaskCount(db.Model):
+    __tablename__ = 'organization_task_counts'
+    organizationId = db.Column(db.Integer(), db.ForeignKey('organizations.id'), primary_key=True)
+    pending = db.Column(db.Integer(), nullable=False, default=0)
+    completed = db.Column(db.Integer(), nullable=False, default=0)
+    unassigned = db.Column(db.Integer(), nullable=False, default=0) #pending tasks with no assigned user
+
+    def __repr__(self):
+        return f"OrganizationTaskCount object for org ID {self.organizationId}"
+
+class AssigneeTaskCount(db.Model):
+    __tablename__ = 'assignee_task_counts'
+    organizationId = db.Column(db.Integer(), db.ForeignKey('organizations.id'), primary_key=True)
+    userId = db.Column(db.Integer(), db.ForeignKey('users.id'), primary_key=True)
+    pending = db.Column(db.Integer(), nullable=False, default=0)
+    completed = db.Column(db.Integer(), nullable=False, default=0)
+
+    def __repr__(self):
+        return f"AssigneeTaskCount object for user ID {self.userId}, org ID {self.organizationId}"
+
+# task events written in the same transaction as the change that caused them, consumed in batches by events.py
+class OutboxEvent(db.Model):
+    __tablename__ = 'outbox_events'
+    id = db.Column(db.Integer(), primary_key=True)
+    kind = db.Column(db.String(30), nullable=False) #e.g. task.created, task.assigned, task.completed
+    organizationId = db.Column(db.Integer(), nullable=False)
+    taskId = db.Column(db.Integer())
+    actorUserId = db.Column(db.Integer()) #user who made the change
+    subjectUserId = db.Column(db.Integer()) #user the change is about, e.g. the new assignee
+    payload = db.Column(db.Text()) #JSON with details that may not exist later, e.g. the task name
+    createdAt = db.Column(db.DateTime(), nullable=False)
+    claimToken = db.Column(db.String(32)) #set by the worker processing the event
+    claimedAt = db.Column(db.DateTime())
+    attempts = db.Column(db.Integer(), nullable=False, default=0)
+    lastError = db.Column(db.Text())
+    processedAt = db.Column(db.DateTime())
+    __table_args__ = (db.Index('ix_outbox_events_processedAt_id', 'processedAt', 'id'),) # pending events in order
+
+    def __repr__(self):
+        return f"OutboxEvent object for {self.kind} event ID {self.id}"
+
+class ActivityEntry(db.Model):
+    __tablename__ = 'activity_entries'
+    id = db.Column(db.Integer(), primary_key=True)
+    eventId = db.Column(db.Integer(), nullable=False)
+    organizationId = db.Column(db.Integer(), nullable=False)
+    userId = db.Column(db.Integer()) #user whose feed the entry is in, NULL for the organization feed
+    kind = db.Column(db.String(30), nullable=False)
+    taskId = db.Column(db.Integer())
+    summary = db.Column(db.String(255), nullable=False)
+    createdAt = db.Column(db.DateTime(), nullable=False)
+    __table_args__ = (
+        db.Index('ix_activity_entries_organizationId_userId_id', 'organizationId', 'userId', 'id'), # organization feed, newest first
+        db.Index('ix_activity_entries_userId_id', 'userId', 'id'), # user feed, newest first
+        db.Index('ix_activity_entries_eventId', 'eventId'), # replacing the entries of a reprocessed event
+    )
 
     def __repr__(self):
-        return f"TaskDetail object for task ID {self.taskId}"
\ No newline at end of file
+        return f"ActivityEntry object for event ID {self.eventId}"
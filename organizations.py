@@ -0,0 +1,248 @@
+import io
+from flask import Blueprint, request, abort, render_template, redirect, url_for, flash, Response, stream_with_context, current_app
+from flask_login import current_user, login_required
+from extensions import db
+from models import Organization, User, Junction, OrganizationTaskCount
+from queries import keysetPage, orgTaskBoard, orgTasksAssignedTo, orgActivity, orgArchive
+from maintenance import purgeCompletedTasks, archiveCompletedTasks
+from counters import orgTaskSummary, assigneeCounts
+from taskservice import unassignTasks
+from events import publish
+from membership import getMembership, membershipStatus, invalidateMembership, orgMembersWithAdmin
+import cache
+from responsecache import cachedResponse, bumpAfterCommit
+from routes import pageArgs
+
+
+# routes for organization management, task boards, bulk export/import and the task archive
+# forms, live.py, transfer.py and search.py are imported by the views that use them (see routes.py)
+
+blueprint = Blueprint('organizations', __name__)
+
+@blueprint.route('/organizations/register', methods=['GET', 'POST'])
+@login_required # must be logged to create organization and be given organization admin rights
+def organizationRegistration():
+    from forms import OrganizationRegistrationForm, ValidationError
+    form = OrganizationRegistrationForm()
+    if form.validate_on_submit():
+        try:
+            if form.validateName(form.name.data): # ensure org name is unique
+                org = Organization(name=form.name.data, about=form.about.data, address=form.address.data, contactUserId=current_user.id) # set organization contact as org creator
+                db.session.add(org)
+                bumpAfterCommit(db.session, 'organizations') # new organization shows up on the cached organization browse pages
+                db.session.commit() # commit org so org.id can be used in following processes
+                junction = Junction(organizationId = org.id, userId = current_user.id, orgAdmin=True) # make org creator a member of org and give Admin rights
+                db.session.add(junction)
+                db.session.add(OrganizationTaskCount(organizationId = org.id, pending = 0, completed = 0, unassigned = 0)) # start task counters at zero
+                db.session.commit()
+                invalidateMembership(current_user.id, org.id)
+                flash('Congratulations, your organization is now registered!')
+                return redirect(url_for('main.landingPage', _external=True, _scheme='HTTPS'))
+        except ValidationError:
+            form.name.errors.append('Organization name is already in use.')
+    return render_template('organizationRegistration.html', title='TaskTracker Organization Registration', form=form)
+
+@blueprint.route('/organizations/browse')
+@cachedResponse(lambda: ['organizations'])
+def organizationBrowse():
+    page = keysetPage(Organization.query, Organization.id, **pageArgs())
+    return render_template('organizationBrowse.html', title='Browse TaskTracker Organizations', organizations=page.items, page=page)
+
+orgIdsByName = cache.LRUCache(4096) # organization names and ids never change, so this needs no invalidation
+
+def orgPageNamespaces(name): # cached organization pages are versioned per organization id, None for unknown names (not cached)
+    orgId = orgIdsByName.get(name)
+    if orgId is None:
+        org = Organization.query.with_entities(Organization.id).filter_by(name=name).first()
+        if org is None:
+            return None
+        orgId = org.id
+        orgIdsByName.set(name, orgId)
+    return [f'org:{orgId}']
+
+@blueprint.route('/organizations/profile/<name>', methods=['GET', 'POST'])
+@cachedResponse(orgPageNamespaces)
+def organizationProfile(name):
+    from forms import AboutForm
+    org = Organization.query.filter_by(name=name).first()
+    current_member = False
+    is_admin = False
+    form = None
+    if current_user.is_authenticated: # potential extra data for authenticated users
+        if current_user.id == org.contactUserId: # if user viewing profile is org creator, allow update of About org
+            form = AboutForm()
+            if form.validate_on_submit():
+                org.about = form.about.data
+                bumpAfterCommit(db.session, f'org:{org.id}', f'orgDetails:{org.id}') # cached profile page and its details fragment
+                db.session.commit()
+                return redirect(url_for('organizations.organizationProfile', name=org.name, _external=True, _scheme="HTTPS"))
+        # check if current user is already a member of selected organization for join/leave, list members links, admin rights
+        current_member, is_admin = membershipStatus(current_user.id, org.id)
+    taskSummary = orgTaskSummary(org.id) if current_member else None # pending/completed badges for members
+    return render_template('organizationProfile.html', title=f"{org.name}'s TaskTracker Profile", org=org, form=form, current_member=current_member, is_admin=is_admin, taskSummary=taskSummary)
+
+@blueprint.route('/organizations/members/<name>', methods=['GET', 'POST'])
+@login_required
+def organizationMembers(name):
+    from forms import GrantAdminForm, ValidationError
+    org = Organization.query.filter_by(name=name).first()
+    form = None
+    currentUserIsMember, currentUserIsAdmin = membershipStatus(current_user.id, org.id)
+    if not currentUserIsMember: # member list is only available to members
+        abort(403)
+    page = orgMembersWithAdmin(org.id, **pageArgs()) # page of (member, orgAdmin boolean) tuples for the org loaded in one query
+    memberAdminList = page.items
+    memberTaskCounts = assigneeCounts(org.id, [member[0].id for member in memberAdminList]) # pending/completed tasks per member on this page
+    if currentUserIsAdmin: # check if user viewing page is an org admin for granting admin rights to other users
+        form = GrantAdminForm()
+        if form.validate_on_submit():
+            try:
+                if form.checkUserId(org, form.newAdminUserId.data):
+                    newAdminJunction = getMembership(form.newAdminUserId.data, org.id)
+                    newAdminJunction.orgAdmin = True
+                    db.session.commit()
+                    invalidateMembership(newAdminJunction.userId, org.id)
+                    newAdmin = User.query.get(newAdminJunction.userId)
+                    flash(f'{newAdmin.username} is now an Admin of {org.name}')
+                    return redirect(url_for('organizations.organizationMembers', name=org.name, _external=True, _scheme="HTTPS"))
+            except ValidationError:
+                form.newAdminUserId.errors.append('The provided User ID does not match any users in the organization.')
+    return render_template('organizationMembers.html', title=f"{org.name}'s Member List", org=org, memberAdminList=memberAdminList, memberTaskCounts=memberTaskCounts, form=form, page=page)
+
+@blueprint.route('/organizations/tasks/<name>', methods=['GET', 'POST'])
+@login_required
+def organizationTasks(name):
+    from forms import ClearCompletedTasksForm
+    org = Organization.query.filter_by(name=name).first()
+    isMember, isAdmin = membershipStatus(current_user.id, org.id) # check membership and orgAdmin status for current user and organization
+    if not isMember: # organization task board is only available to members
+        abort(403)
+    liveFromId = None
+    if current_app.config['LIVE_UPDATES_ENABLED']: # read before the tasks, the stream replays anything committed after this
+        from live import latestEventId
+        liveFromId = latestEventId()
+    page = orgTaskBoard(org.id, **pageArgs()) # page of tasks loaded with details and assigned users so the template doesn't query per task
+    completeTasks = []
+    incompleteTasks = []
+    for task in page.items:
+        if task.taskComplete:
+            completeTasks.append(task)
+        else:
+            incompleteTasks.append(task)
+    form = ClearCompletedTasksForm()
+    if isAdmin and form.validate_on_submit(): # if org admin chooses to delete completed tasks
+        if form.clearTasks.data:
+            # set based removal of every completed task in the org (not only the ones on the current page), committed in chunks
+            if current_app.config['ARCHIVE_ON_CLEAR']: # moved to the read only archive rather than deleted
+                removed = archiveCompletedTasks(org.id, form.olderThanDays.data, current_app.config['PURGE_CHUNK_SIZE'], current_user.id)
+                flash(f"{removed['tasks']} completed tasks have been moved to the archive")
+            else:
+                removed = purgeCompletedTasks(org.id, form.olderThanDays.data, current_app.config['PURGE_CHUNK_SIZE'], current_user.id)
+                flash(f"{removed['tasks']} completed tasks have been cleared from the record")
+            return redirect(url_for("organizations.organizationTasks", name=org.name, _external=True, _scheme="HTTPS"))
+        else:
+            flash('Please check the "Clear completed tasks" box to confirm completed task deletion')
+            return redirect(url_for("organizations.organizationTasks", name=org.name, _external=True, _scheme="HTTPS"))
+    return render_template('organizationTasks.html', title=f"{org.name}'s Pending Tasks", org=org, completeTasks=completeTasks, incompleteTasks=incompleteTasks, isAdmin=isAdmin, form=form, page=page, taskSummary=orgTaskSummary(org.id), liveFromId=liveFromId)
+
+@blueprint.route('/organizations/tasks/<name>/events')
+@login_required
+def organizationTaskEvents(name): # Server-Sent Events stream of task board changes, applied to the open board by organizationTasks.html
+    from live import eventStream, liveBroker
+    if not current_app.config['LIVE_UPDATES_ENABLED']:
+        abort(404)
+    streamLimit = current_app.config['LIVE_MAX_STREAMS']
+    if streamLimit and liveBroker().streamCount() >= streamLimit: # keep request threads free for the other routes, the browser stops retrying on an error status
+        abort(503)
+    org = Organization.query.filter_by(name=name).first_or_404()
+    if not membershipStatus(current_user.id, org.id)[0]: # same audience as the task board
+        abort(403)
+    lastEventId = request.headers.get('Last-Event-ID', request.args.get('lastEventId')) # sent by the browser when it reconnects
+    lastEventId = int(lastEventId) if lastEventId and lastEventId.isdigit() else None
+    response = Response(stream_with_context(eventStream(org.id, lastEventId)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no' # stop nginx from buffering the stream
+    return response
+
+@blueprint.route('/organizations/tasks/<name>/transfer', methods=['GET', 'POST'])
+@login_required
+def organizationTaskTransfer(name): # export links and bulk import form for org admins
+    from forms import TaskImportForm
+    from transfer import importTasks, detectFormat, FORMATS
+    org = Organization.query.filter_by(name=name).first_or_404()
+    if not membershipStatus(current_user.id, org.id)[1]:
+        abort(403)
+    form = TaskImportForm()
+    if form.validate_on_submit():
+        upload = form.file.data
+        # read straight from the upload (spooled to disk by werkzeug when large), one batch of rows in memory at a time
+        textFile = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+        result = importTasks(org.id, textFile, detectFormat(upload.filename), current_user.id, current_app.config['TRANSFER_BATCH_SIZE'])
+        flash(f"Imported {result['imported']} tasks, skipped {result['skipped']} rows")
+        for error in result['errors']:
+            flash(error)
+        return redirect(url_for("organizations.organizationTaskTransfer", name=org.name, _external=True, _scheme="HTTPS"))
+    return render_template('organizationTaskTransfer.html', title=f"{org.name}'s Task Export and Import", org=org, form=form, formats=FORMATS)
+
+@blueprint.route('/organizations/tasks/<name>/export.<format>')
+@login_required
+def organizationTaskExport(name, format): # every task in the organization as a CSV or JSONL download, streamed as it is read
+    from transfer import exportTasks, FORMATS
+    org = Organization.query.filter_by(name=name).first_or_404()
+    if format not in FORMATS:
+        abort(404)
+    if not membershipStatus(current_user.id, org.id)[1]: # includes every task's notes, so org admins only
+        abort(403)
+    response = Response(stream_with_context(exportTasks(org.id, format, current_app.config['TRANSFER_BATCH_SIZE'])), mimetype=FORMATS[format])
+    response.headers['Content-Disposition'] = f'attachment; filename="{org.id}-tasks.{format}"'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@blueprint.route('/organizations/archive/<name>')
+@login_required
+def organizationArchive(name): # read only list of the organization's archived tasks, ?q= searches their names and notes
+    from search import archiveMatches
+    org = Organization.query.filter_by(name=name).first_or_404()
+    if not membershipStatus(current_user.id, org.id)[0]: # same audience as the task board
+        abort(403)
+    q = (request.args.get('q') or '').strip() or None
+    page = orgArchive(org.id, archiveMatches(org.id, q) if q else None, **pageArgs())
+    return render_template('organizationArchive.html', title=f"{org.name}'s Archived Tasks", org=org, tasks=page.items, page=page, q=q)
+
+@blueprint.route('/organizations/activity/<name>')
+@login_required
+def organizationActivity(name):
+    org = Organization.query.filter_by(name=name).first_or_404()
+    if not membershipStatus(current_user.id, org.id)[0]: # activity feed is only available to members
+        abort(403)
+    page = orgActivity(org.id, **pageArgs()) # written by the event worker, so the newest changes can take a moment to appear
+    return render_template('organizationActivity.html', title=f"{org.name}'s Recent Activity", org=org, entries=page.items, page=page)
+
+@blueprint.route('/organizations/join/<name>')
+@login_required
+def organizationJoin(name):
+    org = Organization.query.filter_by(name=name).first()
+    junction = Junction(organizationId = org.id, userId = current_user.id, orgAdmin=False)
+    db.session.add(junction)
+    publish('member.joined', org.id, actorUserId=current_user.id)
+    db.session.commit()
+    invalidateMembership(current_user.id, org.id)
+    flash(f'You are now a member of {org.name}.')
+    return redirect(url_for("organizations.organizationProfile", name=org.name, _external=True, _scheme="HTTPS"))
+
+@blueprint.route('/organizations/leave/<name>')
+@login_required
+def organizationLeave(name):
+    org = Organization.query.filter_by(name=name).first()
+    if org.contactUserId == current_user.id:
+        flash('Sorry, organization creators are not allowed to leave their organization')
+        return redirect(url_for("organizations.organizationProfile", name=org.name, _external=True, _scheme="HTTPS"))
+    currentlyAssignedTasks = orgTasksAssignedTo(org.id, current_user.id)
+    unassignTasks(currentlyAssignedTasks) # unassign tasks and remove task assignor from task details
+    junctionToRemove = Junction.query.filter_by(userId = current_user.id, organizationId = org.id).first()
+    db.session.delete(junctionToRemove)
+    publish('member.left', org.id, actorUserId=current_user.id)
+    db.session.commit()
+    invalidateMembership(current_user.id, org.id)
+    flash(f'You are no longer a member of {org.name}. All associated tasks have been unassigned.')
+    return redirect(url_for("organizations.organizationProfile", name=org.name, _external=True, _scheme="HTTPS"))
@@ -0,0 +1,119 @@
+import os
+import threading
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+from cache import LRUCache
+
+
+# Password hashing and login throttling.
+# Hash method and salt length come from PASSWORD_HASH_METHOD and PASSWORD_SALT_LENGTH. Hashes made with older settings are
+# replaced the next time their user logs in (see needsRehash). With PASSWORD_HASH_WORKERS > 0 the hashing runs in a process pool
+# of that size per worker process, so a burst of logins can use at most that many cores and the request threads serving
+# other routes keep theirs. 0 hashes inline in the request thread.
+
+def normalizeMethod(method): # method as werkzeug writes it into the hash, e.g. 'pbkdf2:sha256' -> 'pbkdf2:sha256:260000'
+    parts = method.split(':')
+    if parts[0] == 'pbkdf2' and len(parts) == 2:
+        parts.append(str(DEFAULT_PBKDF2_ITERATIONS))
+    return ':'.join(parts)
+
+class PasswordHasher:
+    def __init__(self, method='pbkdf2:sha256', saltLength=16, workers=0):
+        self.method = normalizeMethod(method)
+        self.saltLength = saltLength
+        self.workers = workers
+        self._pool = None
+        self._poolPid = None
+        self._lock = threading.Lock()
+
+    def pool(self): # created on first use in each process, a pool inherited through fork is not usable
+        if self._pool is None or self._poolPid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._poolPid != os.getpid():
+                    self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+                    self._poolPid = os.getpid()
+        return self._pool
+
+    def run(self, function, *args):
+        if not self.workers:
+            return function(*args)
+        return self.pool().submit(function, *args).result() # the request thread waits without holding a core
+
+    def hash(self, password):
+        return self.run(generate_password_hash, password, self.method, self.saltLength)
+
+    def verify(self, passwordHash, password):
+        return self.run(check_password_hash, passwordHash, password)
+
+    def needsRehash(self, passwordHash): # True when the hash was made with a different method, cost or salt length
+        method, _, rest = passwordHash.partition('$')
+        salt = rest.partition('$')[0]
+        return method != self.method or len(salt) != self.saltLength
+
+    def start(self): # start the pool's processes ahead of the first login
+        if self.workers:
+            for future in [self.pool().submit(len, '') for _ in range(self.workers)]:
+                future.result()
+
+    def shutdown(self):
+        if self._pool is not None and self._poolPid == os.getpid():
+            self._pool.shutdown()
+        self._pool = None
+
+
+_hasher = None
+_hasherLock = threading.Lock()
+
+def passwordHasher(): # PasswordHasher for the current app settings, one per process
+    global _hasher
+    config = current_app.config
+    settings = (normalizeMethod(config['PASSWORD_HASH_METHOD']), config['PASSWORD_SALT_LENGTH'], config['PASSWORD_HASH_WORKERS'])
+    hasher = _hasher
+    if hasher is None or (hasher.method, hasher.saltLength, hasher.workers) != settings:
+        with _hasherLock:
+            if _hasher is None or (_hasher.method, _hasher.saltLength, _hasher.workers) != settings:
+                if _hasher is not None:
+                    _hasher.shutdown()
+                _hasher = PasswordHasher(*settings)
+            hasher = _hasher
+    return hasher
+
+def hashPassword(password):
+    return passwordHasher().hash(password)
+
+def verifyPassword(passwordHash, password):
+    return passwordHasher().verify(passwordHash, password)
+
+def needsRehash(passwordHash):
+    return passwordHasher().needsRehash(passwordHash)
+
+
+# failed logins per client address and per attempted username in fixed windows of LOGIN_FAILURE_WINDOW seconds.
+# The username key slows down guessing one account from many addresses, and counts attempts on usernames that don't exist too.
+# Counters are kept per worker process, so a client spread over every worker gets up to LOGIN_MAX_FAILURES x workers attempts
+_loginFailures = LRUCache(maxSize=10000)
+
+def loginKeys(address, username):
+    return [('address', address), ('username', username)]
+
+def loginThrottled(address, username): # True once the address or the username reached LOGIN_MAX_FAILURES failed logins in the current window
+    limit = current_app.config['LOGIN_MAX_FAILURES']
+    if not limit:
+        return False
+    now = time.monotonic()
+    for key in loginKeys(address, username):
+        entry = _loginFailures.get(key)
+        if entry and entry[1] >= limit and now - entry[0] < current_app.config['LOGIN_FAILURE_WINDOW']:
+            return True
+    return False
+
+def recordLoginFailure(address, username):
+    now = time.monotonic()
+    for key in loginKeys(address, username):
+        entry = _loginFailures.get(key)
+        if entry is None or now - entry[0] >= current_app.config['LOGIN_FAILURE_WINDOW']: # start a new window
+            entry = (now, 0)
+        _loginFailures.set(key, (entry[0], entry[1] + 1))
@@ -0,0 +1,79 @@
+from models import Task, TaskDetail, ActivityEntry, ArchivedTask
+from sqlalchemy.orm import joinedload
+from collections import namedtuple
+
+
+# Query layer for task pages. Each function loads everything its template needs up front
+# so rendering never triggers additional lazy loads (one SELECT per page instead of 1 + 2 per task).
+
+# one page of keyset paginated results. Cursors are the id values to pass back as ?after= or ?before=, None when there is no page in that direction
+# size is None when the default page size is in use so pager links don't carry it
+Page = namedtuple('Page', ['items', 'nextCursor', 'prevCursor', 'size'])
+
+def keysetPage(query, column, after=None, before=None, size=None, defaultSize=50, cursor=None, descending=False):
+    # paginate on a unique, indexed id column instead of OFFSET so every page costs the same no matter how deep it is
+    # cursor extracts the id value from a result row, needed when the query returns tuples rather than model objects
+    # descending lists newest first, "after" then means further down the list (smaller ids)
+    pageSize = size or defaultSize
+    cursor = cursor or (lambda item: getattr(item, column.key))
+    forward, backward = (column.desc(), column) if descending else (column, column.desc())
+    def below(value): # rows further down the list than the cursor
+        return column < value if descending else column > value
+    def above(value):
+        return column > value if descending else column < value
+    if before is not None: # walking backwards: take the rows just above the cursor in reverse order, then flip them back
+        rows = query.filter(above(before)).order_by(backward).limit(pageSize + 1).all()
+        hasMore = len(rows) > pageSize
+        items = list(reversed(rows[:pageSize]))
+        prevCursor = cursor(items[0]) if items and hasMore else None
+        nextCursor = cursor(items[-1]) if items else None
+    else:
+        if after is not None:
+            query = query.filter(below(after))
+        rows = query.order_by(forward).limit(pageSize + 1).all()
+        hasMore = len(rows) > pageSize
+        items = rows[:pageSize]
+        prevCursor = cursor(items[0]) if items and after is not None else None
+        nextCursor = cursor(items[-1]) if items and hasMore else None
+    return Page(items, nextCursor, prevCursor, size if size and size != defaultSize else None)
+
+def orgTaskBoard(orgId, **pageArgs): # page of tasks in an organization with their TaskDetail and assigned User joined in
+    query = Task.query.options(joinedload(Task.detail), joinedload(Task.user)).filter(Task.organizationId == orgId)
+    return keysetPage(query, Task.id, **pageArgs)
+
+def userTaskList(userId, **pageArgs): # page of tasks assigned to a user with their organization joined in for the organization links
+    query = Task.query.options(joinedload(Task.organization)).filter(Task.assignedToUserId == userId)
+    return keysetPage(query, Task.id, **pageArgs)
+
+def orgTasksAssignedTo(orgId, userId): # tasks in an organization assigned to one user, used to unassign tasks when the user leaves
+    return Task.query.options(joinedload(Task.detail)).filter(Task.organizationId == orgId, Task.assignedToUserId == userId).all()
+
+def tasksById(taskIds, chunkSize=500): # tasks with their TaskDetail for a list of ids, queried in chunks to stay under SQL parameter limits
+    taskIds = list(dict.fromkeys(taskIds))
+    tasks = []
+    for start in range(0, len(taskIds), chunkSize):
+        tasks.extend(Task.query.options(joinedload(Task.detail)).filter(Task.id.in_(taskIds[start:start + chunkSize])).all())
+    return tasks
+
+def taskWithPeople(taskId): # single task with details, assignee, creator and assignor for the task details page
+    return Task.query.options(
+        joinedload(Task.user),
+        joinedload(Task.detail).joinedload(TaskDetail.createdBy),
+        joinedload(Task.detail).joinedload(TaskDetail.assignedBy),
+    ).filter(Task.id == taskId).first()
+
+def orgActivity(orgId, **pageArgs): # page of the organization's activity feed, newest first
+    query = ActivityEntry.query.filter(ActivityEntry.organizationId == orgId, ActivityEntry.userId.is_(None))
+    return keysetPage(query, ActivityEntry.id, descending=True, **pageArgs)
+
+def userActivity(userId, **pageArgs): # page of the activity involving the user across all organizations, newest first
+    return keysetPage(ActivityEntry.query.filter(ActivityEntry.userId == userId), ActivityEntry.id, descending=True, **pageArgs)
+
+def orgArchive(orgId, criterion=None, **pageArgs): # page of the organization's archived tasks with their assignee, newest first, optionally filtered (e.g. by search.archiveMatches)
+    query = ArchivedTask.query.options(joinedload(ArchivedTask.assignedTo)).filter(ArchivedTask.organizationId == orgId)
+    if criterion is not None:
+        query = query.filter(criterion)
+    return keysetPage(query, ArchivedTask.id, descending=True, **pageArgs)
+
+def archivedTaskWithPeople(taskId): # single archived task with assignee, creator and assignor for the archived task page
+    return ArchivedTask.query.options(joinedload(ArchivedTask.assignedTo), joinedload(ArchivedTask.createdBy), joinedload(ArchivedTask.assignedBy)).filter(ArchivedTask.id == taskId).first()
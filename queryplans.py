@@ -0,0 +1,96 @@
+import re
+from collections import namedtuple
+from sqlalchemy import event
+from flask import current_app
+from extensions import db
+from models import User, Organization, Junction, Task
+
+
+# EXPLAIN QUERY PLAN for every SELECT the read only pages run, used by `flask explain-queries`
+# SQLite only, flags full table scans and temporary b-trees (sorts/distincts without a usable index)
+
+READ_PAGES = [ # GET routes without side effects, filled in with a sample user, organization and task
+    '/',
+    '/users/browse',
+    '/organizations/browse',
+    '/users/profile/{username}',
+    '/users/organizations/{username}',
+    '/tasks/{username}',
+    '/organizations/profile/{orgName}',
+    '/organizations/members/{orgName}',
+    '/organizations/tasks/{orgName}',
+    '/organizations/activity/{orgName}',
+    '/organizations/archive/{orgName}',
+    '/organizations/archive/{orgName}?q={orgName}',
+    '/users/activity',
+    '/tasks/details/{taskId}',
+    '/tasks/create',
+    '/search?q={orgName}',
+    '/api/v1/tasks?ids={taskId}',
+]
+
+QueryPlan = namedtuple('QueryPlan', ['path', 'statement', 'lines', 'warnings'])
+
+def isWarning(line):
+    if 'VIRTUAL TABLE' in line: # full text search, planned by fts5
+        return False
+    if 'USE TEMP B-TREE' in line:
+        return True
+    return re.match(r'SCAN \w+$', line) is not None # a scan without USING INDEX reads the whole table
+
+def warnings(statement, lines):
+    flagged = [line for line in lines if isWarning(line)]
+    if ' LIMIT ' in statement and not any('TEMP B-TREE' in line for line in flagged):
+        flagged = [] # a scan already in ORDER BY order stops after LIMIT rows, e.g. the first page of the browse pages
+    return flagged
+
+def sampleValues(username=None): # a user who belongs to an organization with tasks, so every page has rows to show
+    query = db.session.query(User.username, Organization.name, Task.id).join(Junction, Junction.userId == User.id).join(Organization, Organization.id == Junction.organizationId).join(Task, Task.organizationId == Organization.id)
+    if username:
+        query = query.filter(User.username == username)
+    row = query.first()
+    if row is None:
+        return None
+    return dict(username=row[0], orgName=row[1], taskId=row[2])
+
+def captureSelects(path, userId): # run a page as the given user and return the SELECT statements and parameters it executed
+    statements = []
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and not executemany:
+            statements.append((statement, parameters))
+    event.listen(db.engine, 'before_cursor_execute', capture)
+    try:
+        client = current_app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(userId)
+            session['_fresh'] = True
+        response = client.get(path)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capture)
+    return response.status_code, statements
+
+def explain(statement, parameters):
+    connection = db.engine.raw_connection() # the captured parameters are DBAPI (positional) parameters
+    try:
+        rows = connection.cursor().execute('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+    finally:
+        connection.close()
+    return [row[-1] for row in rows]
+
+def explainPages(username=None, paths=None):
+    values = sampleValues(username)
+    if values is None:
+        raise ValueError('Need a user who is a member of an organization with tasks')
+    userId = User.query.filter_by(username=values['username']).first().id
+    plans = []
+    seen = set()
+    for path in paths or READ_PAGES:
+        path = path.format(**values)
+        status, statements = captureSelects(path, userId)
+        for statement, parameters in statements:
+            if statement in seen: # same statement from an earlier page (user loader, membership lookups)
+                continue
+            seen.add(statement)
+            lines = explain(statement, parameters)
+            plans.append(QueryPlan(path, statement, lines, warnings(statement, lines)))
+    return values, plans
@@ -0,0 +1,135 @@
+import time
+import uuid
+from functools import wraps
+from flask import request, session, g, make_response, current_app
+from flask_login import current_user
+from flask_caching import Cache
+from flask_caching.backends.base import BaseCache
+from sqlalchemy import event
+from cache import LRUCache
+from extensions import db
+
+
+# Full page and template fragment caching for pages that are read far more often than they change.
+# The backend is picked with CACHE_TYPE (see config.py): NullCache (off, the default), responsecache.LRUBackend (in process),
+# FileSystemCache (CACHE_DIR, shared by the workers on one host) or RedisCache (CACHE_REDIS_URL, shared by every host).
+# Cached pages are keyed on the logged in user and path, plus the current version of every namespace the page depends on
+# ('users', 'organizations', 'org:<id>'; fragments use 'orgDetails:<id>'). Writes bump namespace versions once their transaction commits, so stale entries are
+# never read again and simply age out. With the in process backend a bump is only seen by the worker that made it,
+# so keep CACHE_DEFAULT_TIMEOUT short when running several workers.
+
+responseCache = Cache()
+responseStats = {'hits': 0, 'misses': 0, 'bypassed': 0, 'notModified': 0}
+
+class LRUBackend(BaseCache): # Flask-Caching backend on top of the in process LRUCache, bounded by CACHE_THRESHOLD entries
+    def __init__(self, threshold=2048, default_timeout=300):
+        super().__init__(default_timeout)
+        self._cache = LRUCache(threshold)
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        kwargs.update(threshold=config['CACHE_THRESHOLD'])
+        return cls(*args, **kwargs)
+
+    def get(self, key):
+        entry = self._cache.get(key)
+        if entry is None or (entry[1] and entry[1] < time.monotonic()): # missing or expired
+            return None
+        return entry[0]
+
+    def set(self, key, value, timeout=None):
+        timeout = self._normalize_timeout(timeout)
+        self._cache.set(key, (value, time.monotonic() + timeout if timeout else None)) # timeout 0 never expires
+        return True
+
+    def add(self, key, value, timeout=None):
+        if self.get(key) is not None:
+            return False
+        return self.set(key, value, timeout)
+
+    def delete(self, key):
+        self._cache.delete(key)
+        return True
+
+    def has(self, key):
+        return self.get(key) is not None
+
+    def clear(self):
+        self._cache.clear()
+        return True
+
+
+def namespaceVersions(names): # current version token of each namespace, namespaces without one are started
+    keys = [f'version:{name}' for name in names]
+    versions = responseCache.get_many(*keys) if keys else []
+    for index, version in enumerate(versions):
+        if version is None:
+            versions[index] = uuid.uuid4().hex[:12]
+            responseCache.set(keys[index], versions[index], timeout=0)
+    return versions
+
+def bumpVersions(*names): # start new versions now, every page cached under the old versions is skipped from here on
+    for name in names:
+        responseCache.set(f'version:{name}', uuid.uuid4().hex[:12], timeout=0)
+
+def bumpAfterCommit(session, *names): # bump once the current transaction commits, so no request can cache the old data again under the new version
+    session.info.setdefault('pageVersionBumps', set()).update(names)
+
+def initResponseCache(app):
+    responseCache.init_app(app) # also adds the {% cache timeout, 'name', varyOn... %} fragment tag to Jinja
+    app.jinja_env.globals['pageVersion'] = lambda name: namespaceVersions([name])[0] # for fragment keys, e.g. pageVersion('org:1')
+
+@event.listens_for(db.session, 'after_commit')
+def bumpCommittedVersions(session):
+    names = session.info.pop('pageVersionBumps', None)
+    if names:
+        bumpVersions(*names)
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def dropRolledBackVersions(session, previousTransaction):
+    session.info.pop('pageVersionBumps', None)
+
+
+def cacheable(response): # responses that are safe to replay to the same user later
+    if response.status_code != 200 or response.direct_passthrough or 'Set-Cookie' in response.headers:
+        return False
+    if 'csrf_token' in g or session.modified: # page carries a form token, or the request changed the session
+        return False
+    return True
+
+def conditional(body, contentType, generatedAt):
+    response = current_app.response_class(body, content_type=contentType)
+    response.add_etag() # strong ETag from the body
+    response.last_modified = generatedAt
+    response.headers['Cache-Control'] = 'private, no-cache' # per user pages, browsers keep them but revalidate each time
+    response.vary.add('Cookie')
+    response.make_conditional(request) # 304 Not Modified when If-None-Match or If-Modified-Since match
+    if response.status_code == 304:
+        responseStats['notModified'] += 1
+    return response
+
+def cachedResponse(namespaces=None, timeout=None):
+    # cache the rendered GET response of a view per user and path
+    # namespaces(**viewArgs) returns the namespace names the page depends on, or None to skip caching that request
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**viewArgs):
+            names = namespaces(**viewArgs) if namespaces else []
+            if request.method not in ('GET', 'HEAD') or names is None or '_flashes' in session: # pending flashed messages render into the page once
+                responseStats['bypassed'] += 1
+                return view(**viewArgs)
+            userId = current_user.id if current_user.is_authenticated else 'anon'
+            key = f"page:{userId}:{request.full_path}:{':'.join(namespaceVersions(names))}"
+            entry = responseCache.get(key)
+            if entry is None:
+                responseStats['misses'] += 1
+                response = make_response(view(**viewArgs))
+                if not cacheable(response):
+                    return response
+                entry = (response.get_data(), response.content_type, time.time())
+                responseCache.set(key, entry, timeout=timeout)
+            else:
+                responseStats['hits'] += 1
+            return conditional(*entry)
+        return wrapper
+    return decorator
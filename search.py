@@ -0,0 +1,148 @@
+import re
+from extensions import db
+from models import User, Organization, Task, TaskDetail, Junction, ArchivedTask
+from sqlalchemy import or_, false
+
+
+# Full text search over task names/notes, usernames/names/about and organization names/about/address.
+# On SQLite the index is an FTS5 virtual table kept in sync by triggers on the source tables, so ORM writes, bulk deletes
+# and imports are all covered. Each document's rowid encodes its kind (id * 4 + kind code) so triggers update it by rowid.
+# Other databases fall back to unranked LIKE matching. Tasks are only returned from organizations the searcher belongs to.
+# Archived tasks (kind code 0, so their rowid is id * 4) are only searched when asked for with kind='archivedTask'.
+
+KIND_CODES = {'archivedTask': 0, 'user': 1, 'organization': 2, 'task': 3}
+
+SEARCH_SCHEMA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(title, body, kind UNINDEXED, refId UNINDEXED, orgId UNINDEXED, tokenize='unicode61 remove_diacritics 2')""",
+    # users
+    """CREATE TRIGGER IF NOT EXISTS search_users_insert AFTER INSERT ON users BEGIN
+        INSERT INTO search_index(rowid, title, body, kind, refId, orgId) VALUES (new.id * 4 + 1, new.username, new.nameFirst || ' ' || new.nameLast || ' ' || coalesce(new.about, ''), 'user', new.id, NULL);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_users_update AFTER UPDATE OF username, nameFirst, nameLast, about ON users BEGIN
+        UPDATE search_index SET title = new.username, body = new.nameFirst || ' ' || new.nameLast || ' ' || coalesce(new.about, '') WHERE rowid = new.id * 4 + 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_users_delete AFTER DELETE ON users BEGIN
+        DELETE FROM search_index WHERE rowid = old.id * 4 + 1;
+    END""",
+    # organizations
+    """CREATE TRIGGER IF NOT EXISTS search_organizations_insert AFTER INSERT ON organizations BEGIN
+        INSERT INTO search_index(rowid, title, body, kind, refId, orgId) VALUES (new.id * 4 + 2, new.name, coalesce(new.about, '') || ' ' || new.address, 'organization', new.id, new.id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_organizations_update AFTER UPDATE OF name, about, address ON organizations BEGIN
+        UPDATE search_index SET title = new.name, body = coalesce(new.about, '') || ' ' || new.address WHERE rowid = new.id * 4 + 2;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_organizations_delete AFTER DELETE ON organizations BEGIN
+        DELETE FROM search_index WHERE rowid = old.id * 4 + 2;
+    END""",
+    # tasks, the notes live in task_detail which is inserted after the task
+    """CREATE TRIGGER IF NOT EXISTS search_tasks_insert AFTER INSERT ON tasks BEGIN
+        INSERT INTO search_index(rowid, title, body, kind, refId, orgId) VALUES (new.id * 4 + 3, new.name, coalesce((SELECT notes FROM task_detail WHERE taskId = new.id), ''), 'task', new.id, new.organizationId);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_tasks_update AFTER UPDATE OF name, organizationId ON tasks BEGIN
+        UPDATE search_index SET title = new.name, orgId = new.organizationId WHERE rowid = new.id * 4 + 3;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_tasks_delete AFTER DELETE ON tasks BEGIN
+        DELETE FROM search_index WHERE rowid = old.id * 4 + 3;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_task_detail_insert AFTER INSERT ON task_detail BEGIN
+        UPDATE search_index SET body = coalesce(new.notes, '') WHERE rowid = new.taskId * 4 + 3;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_task_detail_update AFTER UPDATE OF notes ON task_detail BEGIN
+        UPDATE search_index SET body = coalesce(new.notes, '') WHERE rowid = new.taskId * 4 + 3;
+    END""",
+    # archived tasks, inserted by the archive job in the same transaction that deletes the live task
+    """CREATE TRIGGER IF NOT EXISTS search_archived_tasks_insert AFTER INSERT ON archived_tasks BEGIN
+        INSERT INTO search_index(rowid, title, body, kind, refId, orgId) VALUES (new.id * 4, new.name, coalesce(new.notes, ''), 'archivedTask', new.id, new.organizationId);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_archived_tasks_delete AFTER DELETE ON archived_tasks BEGIN
+        DELETE FROM search_index WHERE rowid = old.id * 4;
+    END""",
+]
+
+REBUILD_STATEMENTS = [
+    "DELETE FROM search_index",
+    """INSERT INTO search_index(rowid, title, body, kind, refId, orgId)
+        SELECT id * 4 + 1, username, nameFirst || ' ' || nameLast || ' ' || coalesce(about, ''), 'user', id, NULL FROM users""",
+    """INSERT INTO search_index(rowid, title, body, kind, refId, orgId)
+        SELECT id * 4 + 2, name, coalesce(about, '') || ' ' || address, 'organization', id, id FROM organizations""",
+    """INSERT INTO search_index(rowid, title, body, kind, refId, orgId)
+        SELECT tasks.id * 4 + 3, tasks.name, coalesce(task_detail.notes, ''), 'task', tasks.id, tasks.organizationId FROM tasks LEFT JOIN task_detail ON task_detail.taskId = tasks.id""",
+    """INSERT INTO search_index(rowid, title, body, kind, refId, orgId)
+        SELECT id * 4, name, coalesce(notes, ''), 'archivedTask', id, organizationId FROM archived_tasks""",
+    "INSERT INTO search_index(search_index) VALUES ('optimize')", # merge FTS segments after a bulk load
+]
+
+def usesFts():
+    return db.engine.dialect.name == 'sqlite'
+
+def installSearchIndex(): # create the FTS table and triggers if missing, returns True when the index was newly created
+    if not usesFts():
+        return False
+    exists = db.session.execute(db.text("SELECT 1 FROM sqlite_master WHERE name = 'search_index'")).first() is not None
+    for statement in SEARCH_SCHEMA:
+        db.session.execute(db.text(statement))
+    db.session.commit()
+    return not exists
+
+def rebuildSearchIndex(): # reindex every user, organization and task from the source tables
+    if not usesFts():
+        return
+    for statement in REBUILD_STATEMENTS:
+        db.session.execute(db.text(statement))
+    db.session.commit()
+
+def ftsQuery(text): # turn user input into an FTS5 query: every word must match, as a prefix, with FTS syntax characters stripped
+    words = re.findall(r'\w+', text)
+    return ' '.join(f'"{word}"*' for word in words)
+
+def search(text, userId=None, kind=None, page=1, pageSize=20):
+    # list of result dicts (kind, id, title, snippet) best match first, plus whether there is a next page
+    # tasks are limited to organizations userId belongs to, anonymous searches never return tasks
+    query = ftsQuery(text)
+    if not query:
+        return [], False
+    offset = (page - 1) * pageSize
+    if usesFts():
+        rows = db.session.execute(db.text(
+            """SELECT kind, refId, title, snippet(search_index, 1, '', '', '...', 12) AS snippet FROM search_index
+            WHERE search_index MATCH :query AND (kind = :kind OR :kind IS NULL AND kind != 'archivedTask')
+            AND (kind NOT IN ('task', 'archivedTask') OR orgId IN (SELECT organizationId FROM organization_user_junction WHERE userId = :userId))
+            ORDER BY rank LIMIT :limit OFFSET :offset"""),
+            dict(query=query, kind=kind, userId=userId if userId is not None else -1, limit=pageSize + 1, offset=offset)).all()
+        results = [dict(kind=row.kind, id=row.refId, title=row.title, snippet=row.snippet) for row in rows]
+    else:
+        results = likeSearch(re.findall(r'\w+', text), userId, kind, offset + pageSize + 1)[offset:]
+    return results[:pageSize], len(results) > pageSize
+
+def likeWord(column, word): # column contains word, LIKE wildcards in the word match literally (\w+ words can contain _)
+    escaped = word.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return column.ilike(f'%{escaped}%', escape='\\')
+
+def likeSearch(words, userId, kind, limit): # unranked fallback for databases without FTS5
+    def matchAll(*columns):
+        return [or_(*[likeWord(column, word) for column in columns]) for word in words]
+    results = []
+    if kind in (None, 'user'):
+        for user in User.query.filter(*matchAll(User.username, User.nameFirst, User.nameLast, User.about)).order_by(User.id).limit(limit):
+            results.append(dict(kind='user', id=user.id, title=user.username, snippet=user.about or ''))
+    if kind in (None, 'organization'):
+        for org in Organization.query.filter(*matchAll(Organization.name, Organization.about, Organization.address)).order_by(Organization.id).limit(limit):
+            results.append(dict(kind='organization', id=org.id, title=org.name, snippet=org.about or ''))
+    if kind in (None, 'task') and userId is not None:
+        memberOrgIds = db.session.query(Junction.organizationId).filter(Junction.userId == userId)
+        tasks = db.session.query(Task.id, Task.name, TaskDetail.notes).outerjoin(TaskDetail, TaskDetail.taskId == Task.id).filter(Task.organizationId.in_(memberOrgIds), *matchAll(Task.name, TaskDetail.notes)).order_by(Task.id).limit(limit)
+        for task in tasks:
+            results.append(dict(kind='task', id=task.id, title=task.name, snippet=task.notes or ''))
+    if kind == 'archivedTask' and userId is not None:
+        memberOrgIds = db.session.query(Junction.organizationId).filter(Junction.userId == userId)
+        for task in ArchivedTask.query.filter(ArchivedTask.organizationId.in_(memberOrgIds), *matchAll(ArchivedTask.name, ArchivedTask.notes)).order_by(ArchivedTask.id).limit(limit):
+            results.append(dict(kind='archivedTask', id=task.id, title=task.name, snippet=task.notes or ''))
+    return results
+
+def archiveMatches(orgId, text): # filter on ArchivedTask for an organization's archived tasks matching the search text
+    words = re.findall(r'\w+', text)
+    if not words: # nothing searchable, e.g. only punctuation, matches nothing like search() does
+        return false()
+    if usesFts():
+        return db.text("archived_tasks.id IN (SELECT refId FROM search_index WHERE search_index MATCH :archiveQuery AND kind = 'archivedTask' AND orgId = :archiveOrgId)").bindparams(archiveQuery=ftsQuery(text), archiveOrgId=orgId)
+    return db.and_(*[or_(likeWord(ArchivedTask.name, word), likeWord(ArchivedTask.notes, word)) for word in words])
@@ -0,0 +1,97 @@
+from flask import Blueprint, abort, render_template, redirect, url_for, flash
+from flask_login import current_user, login_required
+from extensions import db
+from models import Organization, User, Junction, ArchivedTask
+from queries import userTaskList, taskWithPeople, archivedTaskWithPeople
+from taskservice import createTasks, assignTasks, completeTasks
+from membership import membershipStatus, orgMemberUsers
+from routes import pageArgs
+
+
+# routes for viewing and managing tasks, forms are imported by the views that use them (see routes.py)
+
+blueprint = Blueprint('tasks', __name__)
+
+@blueprint.route('/tasks/create', methods=['GET', 'POST'])
+@login_required
+def taskCreation():
+    from forms import TaskCreationForm
+    # create list of (user, organization) tuples for every organization associated with current user
+    userOrgPairs = db.session.query(User, Organization).filter(Junction.userId == User.id, Junction.organizationId == Organization.id).filter(User.id == current_user.id).all()
+    currentUserOrgs = [pair[1] for pair in userOrgPairs] # create list of all organizations in userOrgPairs
+    orgChoices = [(org.id, org.name) for org in currentUserOrgs] # create list of (value, label) tuples used by the SelectField for organizationId in form
+    form = TaskCreationForm()
+    form.organizationId.choices = orgChoices # set choices for organizationId SelectField
+    if form.validate_on_submit():
+        # task and task detail are inserted together in one commit, assigned to the creator if requested
+        createTasks([dict(name=form.name.data, organizationId=form.organizationId.data, notes=form.notes.data, assignToMe=form.assignToMe.data)], current_user.id)
+        db.session.commit()
+        flash('Task Creation Successful')
+        org = Organization.query.filter_by(id = form.organizationId.data).first()
+        return redirect(url_for("organizations.organizationTasks", name=org.name)) # redirect to task list for selected organization upon form completion
+    return render_template('taskCreation.html', title='Create New TaskTracker Task', form=form)
+
+@blueprint.route('/tasks/<username>')
+@login_required
+def tasks(username):
+    if current_user.is_authenticated:
+        page = userTaskList(User.query.filter_by(username=username).first_or_404().id, **pageArgs())
+        return render_template('tasks.html', title='Your TaskTracker Tasks', tasks=page.items, page=page, username=username)
+    else:
+        flash('Please login to view your task list')
+        return redirect(url_for('users.login', _external=True, _scheme="HTTPS"))
+
+@blueprint.route('/tasks/')
+@login_required
+def tasks404(): # static route used by @login_required if non logged in user clicks nav bar link
+    pass
+
+@blueprint.route('/tasks/archived/<int:taskId>')
+@login_required
+def archivedTaskDetails(taskId):
+    task = archivedTaskWithPeople(taskId)
+    if not task:
+        abort(404)
+    if not membershipStatus(current_user.id, task.organizationId)[0]:
+        abort(403)
+    return render_template('archivedTaskDetails.html', title=f'Archived Task: {task.name}', task=task, org=Organization.query.get(task.organizationId))
+
+@blueprint.route('/tasks/details/<int:taskId>', methods=['GET', 'POST'])
+@login_required
+def taskDetails(taskId):
+    from forms import TaskAssignmentForm, TaskCompletionForm
+    task = taskWithPeople(taskId) # task, details and related users in one query
+    if not task:
+        if ArchivedTask.query.get(taskId): # old links keep working after the task is archived
+            return redirect(url_for("tasks.archivedTaskDetails", taskId=taskId, _external=True, _scheme="HTTPS"))
+        abort(404)
+    details = task.detail
+    assignedTo = task.user
+    taskCreator = details.createdBy
+    taskAssignor = details.assignedBy
+    isMember, userIsOrgAdmin = membershipStatus(current_user.id, task.organizationId)
+    if not isMember: # task details are only available to members of the task's organization
+        abort(403)
+    if userIsOrgAdmin:
+        usersInOrg = orgMemberUsers(task.organizationId) # every user in the organization
+        userChoices = [(user.id, user.username) for user in usersInOrg] # create list of choices for task assignment form seen by organization admins
+    else:
+        userChoices = [(taskCreator.id, taskCreator.username)] # if task creator is not admin allow them to assign themselves
+    assignmentForm = TaskAssignmentForm()
+    assignmentForm.userId.choices = userChoices # set user choices for user assignment form
+    if assignmentForm.validate_on_submit():
+        assignTasks([task], assignmentForm.userId.data, current_user.id)
+        db.session.commit()
+        flash('Task assignment successful')
+        return redirect(url_for("tasks.taskDetails", taskId=task.id, _external=True, _scheme="HTTPS"))
+    completionForm = TaskCompletionForm()
+    if completionForm.validate_on_submit():
+        if completionForm.completed.data:
+            completeTasks([task], current_user.id)
+            db.session.commit()
+            flash(f'Task marked complete at {details.dateComplete.hour}:{details.dateComplete.minute}')
+            return redirect(url_for("tasks.taskDetails", taskId=task.id, _external=True, _scheme="HTTPS"))
+        else:
+            flash('Please check the "Mark task as completed" box to confirm task completion')
+            return redirect(url_for("tasks.taskDetails", taskId=task.id, _external=True, _scheme="HTTPS"))
+    return render_template('taskDetails.html', title=f"{task.name} Details", task=task, details=details, assignedTo=assignedTo, taskCreator=taskCreator, taskAssignor=taskAssignor, assignmentForm=assignmentForm, completionForm=completionForm)
@@ -0,0 +1,68 @@
+from extensions import db
+from models import Task, TaskDetail
+from counters import TaskCountDelta
+from events import publish
+from datetime import datetime
+
+
+# Task mutations shared by the HTML routes and the JSON API. Each function changes any number of tasks and records the
+# counter changes and publishes task events, but leaves committing to the caller so a whole form post or API batch is one transaction.
+
+class CountDeltas(dict): # TaskCountDelta per organization, created on demand
+    def forOrg(self, orgId):
+        return self.setdefault(orgId, TaskCountDelta(orgId))
+
+    def apply(self):
+        for delta in self.values():
+            delta.apply()
+
+def createTasks(specs, creatorId):
+    # specs: dicts with name, organizationId and optional notes/assignToMe. Tasks and details are inserted in a single flush
+    # because each TaskDetail is attached through Task.detail instead of waiting for the task id
+    tasks = []
+    deltas = CountDeltas()
+    for spec in specs:
+        assignee = creatorId if spec.get('assignToMe') else None
+        task = Task(name=spec['name'], organizationId=spec['organizationId'], assignedToUserId=assignee, taskComplete=False)
+        task.detail = TaskDetail(createdByUserId=creatorId, assignedByUserId=assignee, notes=spec.get('notes'))
+        deltas.forOrg(task.organizationId).change(None, (False, assignee))
+        tasks.append(task)
+    db.session.add_all(tasks)
+    db.session.flush()
+    deltas.apply()
+    for task in tasks:
+        publish('task.created', task.organizationId, task.id, creatorId, task.assignedToUserId, taskName=task.name)
+    return tasks
+
+def assignTasks(tasks, userId, assignorId): # assign every task to userId, recording who assigned it
+    deltas = CountDeltas()
+    for task in tasks:
+        deltas.forOrg(task.organizationId).change((task.taskComplete, task.assignedToUserId), (task.taskComplete, userId))
+        task.assignedToUserId = userId
+        task.detail.assignedByUserId = assignorId
+        publish('task.assigned', task.organizationId, task.id, assignorId, userId, taskName=task.name)
+    deltas.apply()
+    return tasks
+
+def completeTasks(tasks, actorId=None): # mark tasks complete, tasks that are already complete are left untouched
+    deltas = CountDeltas()
+    completedAt = datetime.now()
+    for task in tasks:
+        if task.taskComplete:
+            continue
+        deltas.forOrg(task.organizationId).change((False, task.assignedToUserId), (True, task.assignedToUserId))
+        task.taskComplete = True
+        task.detail.dateComplete = completedAt
+        publish('task.completed', task.organizationId, task.id, actorId or task.assignedToUserId, task.assignedToUserId, taskName=task.name)
+    deltas.apply()
+    return tasks
+
+def unassignTasks(tasks): # remove assignee and assignor, used when the assignee leaves the organization
+    deltas = CountDeltas()
+    for task in tasks:
+        deltas.forOrg(task.organizationId).change((task.taskComplete, task.assignedToUserId), (task.taskComplete, None))
+        publish('task.unassigned', task.organizationId, task.id, subjectUserId=task.assignedToUserId, taskName=task.name)
+        task.assignedToUserId = None
+        task.detail.assignedByUserId = None
+    deltas.apply()
+    return tasks
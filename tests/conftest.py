@@ -0,0 +1,17 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # the app's modules live at the repo root
+
+
+@pytest.fixture
+def app(tmp_path): # app on a fresh SQLite file migrated to the latest schema
+    from flask_migrate import upgrade
+    from app import create_app
+    from extensions import migrations
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'test.db'), 'TESTING': True, 'WTF_CSRF_ENABLED': False})
+    with app.app_context():
+        migrations(app)
+        upgrade()
+    return app # not yielded inside the app context, requests would share its g (and the per request caches kept there)
@@ -0,0 +1,101 @@
+import pytest
+import api
+from extensions import db
+from models import User, Organization, Junction, Task, TaskDetail, OrganizationTaskCount
+
+
+# JSON API validation and its all or nothing batches (user-011)
+
+@pytest.fixture
+def client(app): # member 1 (admin of org 1) logged in, member 2 in org 1, user 3 only in org 2, tasks 1 and 2 unassigned in org 1, task 3 in org 2
+    with app.app_context():
+        db.session.execute(User.__table__.insert(), [dict(id=userId, username=f'user{userId}', passwordHash='x', nameFirst='U', nameLast='U', email=f'u{userId}@example.com') for userId in (1, 2, 3)])
+        db.session.execute(Organization.__table__.insert(), [dict(id=1, name='org', address='1 Street', contactUserId=1), dict(id=2, name='other', address='2 Street', contactUserId=3)])
+        db.session.execute(Junction.__table__.insert(), [dict(organizationId=1, userId=1, orgAdmin=True), dict(organizationId=1, userId=2, orgAdmin=False), dict(organizationId=2, userId=3, orgAdmin=True)])
+        db.session.execute(Task.__table__.insert(), [dict(id=1, name='one', organizationId=1, taskComplete=False), dict(id=2, name='two', organizationId=1, taskComplete=False), dict(id=3, name='three', organizationId=2, taskComplete=False)])
+        db.session.execute(TaskDetail.__table__.insert(), [dict(taskId=taskId, createdByUserId=1 if taskId < 3 else 3) for taskId in (1, 2, 3)])
+        db.session.commit()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = '1'
+        session['_fresh'] = True
+    return client
+
+def taskState(app): # {task id: (name, assignee, complete)} straight from the database
+    with app.app_context():
+        return {task.id: (task.name, task.assignedToUserId, task.taskComplete) for task in Task.query}
+
+def newTask(**fields):
+    return dict(dict(name='new', organizationId=1), **fields)
+
+def test_login_required(app):
+    assert app.test_client().get('/api/v1/tasks?ids=1').status_code == 401
+
+def test_batch_size_is_capped(app, client):
+    app.config['API_MAX_BATCH'] = 2
+    assert client.post('/api/v1/tasks', json=dict(tasks=[newTask()] * 3)).status_code == 400
+    assert client.post('/api/v1/tasks/complete', json=dict(taskIds=[1, 2, 3])).status_code == 400
+    assert client.get('/api/v1/tasks?ids=1,2,3').status_code == 400
+    assert client.post('/api/v1/tasks', json=dict(tasks=[newTask()] * 2)).status_code == 201
+
+@pytest.mark.parametrize('spec', [
+    newTask(organizationId=True),
+    newTask(organizationId='1'),
+    newTask(organizationId=1.5),
+    newTask(assignToMe=1),
+    newTask(assignToMe='yes'),
+    newTask(name='   '),
+    newTask(name='x' * 46),
+    newTask(notes=5),
+])
+def test_invalid_task_specs_are_rejected(app, client, spec):
+    before = taskState(app)
+    response = client.post('/api/v1/tasks', json=dict(tasks=[newTask(), spec]))
+    assert response.status_code == 400
+    assert response.get_json()['index'] == 1
+    assert taskState(app) == before # the valid first task is not created either
+
+@pytest.mark.parametrize('taskIds', [[True], [1, '2'], [1.0], [], 'one'])
+def test_task_id_lists_must_be_integers(client, taskIds):
+    assert client.post('/api/v1/tasks/assign', json=dict(taskIds=taskIds, userId=1)).status_code == 400
+
+def test_bool_user_id_is_rejected(client):
+    assert client.post('/api/v1/tasks/assign', json=dict(taskIds=[1], userId=True)).status_code == 400
+
+def test_missing_tasks_are_404(app, client):
+    response = client.post('/api/v1/tasks/assign', json=dict(taskIds=[1, 98, 99], userId=1))
+    assert response.status_code == 404
+    assert response.get_json()['taskIds'] == [98, 99]
+    assert taskState(app)[1][1] is None
+
+def test_non_members_are_forbidden(app, client):
+    before = taskState(app)
+    assert client.post('/api/v1/tasks', json=dict(tasks=[newTask(), newTask(organizationId=2)])).status_code == 403
+    response = client.post('/api/v1/tasks/assign', json=dict(taskIds=[1, 3], userId=1))
+    assert response.status_code == 403
+    assert response.get_json()['taskIds'] == [3]
+    assert client.post('/api/v1/tasks/assign', json=dict(taskIds=[1], userId=3)).status_code == 403 # user 3 is not in org 1
+    assert [task['id'] for task in client.get('/api/v1/tasks?ids=1,3').get_json()['tasks']] == [1]
+    assert taskState(app) == before
+
+def test_batch_failing_while_applied_is_rolled_back(app, client, monkeypatch):
+    def completeThenFail(tasks, userId):
+        completeTasks(tasks, userId)
+        db.session.flush()
+        raise RuntimeError('notifier down')
+    completeTasks = api.completeTasks
+    assert client.post('/api/v1/tasks/assign', json=dict(taskIds=[1, 2], userId=1)).status_code == 200
+    before = taskState(app)
+    monkeypatch.setattr(api, 'completeTasks', completeThenFail)
+    with pytest.raises(RuntimeError):
+        client.post('/api/v1/tasks/complete', json=dict(taskIds=[1, 2]))
+    assert taskState(app) == before
+    with app.app_context():
+        assert OrganizationTaskCount.query.get(1).completed == 0
+
+def test_created_names_are_stripped(app, client):
+    response = client.post('/api/v1/tasks', json=dict(tasks=[newTask(name='  padded  ', assignToMe=True)]))
+    assert response.status_code == 201
+    created = response.get_json()['tasks'][0]
+    assert created['name'] == 'padded'
+    assert taskState(app)[created['id']] == ('padded', 1, False)
@@ -0,0 +1,100 @@
+import io
+import pytest
+from extensions import db
+import counters
+from models import User, Task, OrganizationTaskCount, AssigneeTaskCount
+from counters import recomputeOrgCounts, orgTaskSummary
+
+
+# The task counters maintained by every write path must always equal what `flask recompute-task-counts` builds from the tasks table (user-010)
+
+def loggedIn(app, userId):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(userId)
+        session['_fresh'] = True
+    return client
+
+@pytest.fixture
+def clients(app): # admin (user 1) registered org through the app, member (user 2) joined it
+    with app.app_context():
+        db.session.execute(User.__table__.insert(), [dict(id=userId, username=f'user{userId}', passwordHash='x', nameFirst='U', nameLast='U', email=f'u{userId}@example.com') for userId in (1, 2)])
+        db.session.commit()
+    admin, member = loggedIn(app, 1), loggedIn(app, 2)
+    assert admin.post('/organizations/register', data=dict(name='org', address='1 Street', about='')).status_code == 302
+    assert member.get('/organizations/join/org').status_code == 302
+    return admin, member
+
+def counterRows():
+    org = OrganizationTaskCount.query.get(1)
+    assignees = {row.userId: (row.pending, row.completed) for row in AssigneeTaskCount.query.filter_by(organizationId=1) if row.pending or row.completed}
+    return (org.pending, org.completed, org.unassigned), assignees
+
+def assertCountsExact(app):
+    with app.app_context():
+        maintained = counterRows()
+        recomputeOrgCounts(1)
+        db.session.flush()
+        assert counterRows() == maintained
+        db.session.rollback()
+    return maintained
+
+def createTask(client, name, assignToMe=False):
+    data = dict(name=name, notes='', organizationId=1)
+    if assignToMe:
+        data['assignToMe'] = 'y'
+    assert client.post('/tasks/create', data=data).status_code == 302
+
+def taskId(app, name):
+    with app.app_context():
+        return Task.query.filter_by(name=name).first().id
+
+@pytest.mark.parametrize('upsert', [True, False], ids=['upsert', 'update then insert'])
+def test_counts_stay_exact_through_every_write(app, clients, monkeypatch, upsert):
+    if not upsert: # the path for databases without INSERT ... ON CONFLICT
+        monkeypatch.setattr(counters, 'UPSERTS', {})
+    admin, member = clients
+    for i in range(4):
+        createTask(admin, f'open {i}')
+    createTask(member, 'mine', assignToMe=True)
+    assert assertCountsExact(app) == ((5, 0, 4), {2: (1, 0)})
+
+    for i in range(3): # assign
+        assert admin.post(f"/tasks/details/{taskId(app, f'open {i}')}", data=dict(userId=2)).status_code == 302
+    assert admin.post(f"/tasks/details/{taskId(app, 'open 3')}", data=dict(userId=1)).status_code == 302
+    assert assertCountsExact(app) == ((5, 0, 0), {1: (1, 0), 2: (4, 0)})
+
+    for name in ('open 0', 'open 1', 'mine'): # complete
+        assert member.post(f'/tasks/details/{taskId(app, name)}', data=dict(completed='y')).status_code == 302
+    assert assertCountsExact(app) == ((2, 3, 0), {1: (1, 0), 2: (1, 3)})
+
+    assert member.get('/organizations/leave/org').status_code == 302 # leave org, the member's tasks are unassigned
+    assert assertCountsExact(app) == ((2, 3, 1), {1: (1, 0)})
+
+    app.config['ARCHIVE_ON_CLEAR'] = 0 # purge
+    assert admin.post(f"/tasks/details/{taskId(app, 'open 3')}", data=dict(completed='y')).status_code == 302
+    assert admin.post('/organizations/tasks/org', data=dict(clearTasks='y')).status_code == 302
+    assert assertCountsExact(app) == ((1, 0, 1), {})
+
+    app.config['ARCHIVE_ON_CLEAR'] = 1 # archive
+    assert admin.post(f"/tasks/details/{taskId(app, 'open 2')}", data=dict(userId=1)).status_code == 302
+    assert admin.post(f"/tasks/details/{taskId(app, 'open 2')}", data=dict(completed='y')).status_code == 302
+    assert admin.post('/organizations/tasks/org', data=dict(clearTasks='y')).status_code == 302
+    assert assertCountsExact(app) == ((0, 0, 0), {})
+
+    upload = io.BytesIO(b'name,assignedTo,taskComplete\nfirst,user1,false\nsecond,,true\nthird,,false\nfourth,user1,true\n') # import
+    response = admin.post('/organizations/tasks/org/transfer', data=dict(file=(upload, 'tasks.csv')), content_type='multipart/form-data')
+    assert response.status_code == 302
+    assert assertCountsExact(app) == ((2, 2, 1), {1: (1, 1)})
+
+def test_summary_of_organization_without_counters_is_not_saved(app, clients):
+    admin, member = clients
+    createTask(admin, 'one')
+    with app.app_context():
+        OrganizationTaskCount.query.filter_by(organizationId=1).delete()
+        db.session.commit()
+    assert admin.get('/organizations/tasks/org').status_code == 200
+    with app.app_context():
+        assert OrganizationTaskCount.query.get(1) is None
+        summary = orgTaskSummary(1)
+        assert (summary.pending, summary.completed, summary.unassigned) == (1, 0, 1)
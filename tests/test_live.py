@@ -0,0 +1,68 @@
+import re
+import pytest
+from datetime import datetime
+from extensions import db
+from models import User, Organization, Junction, OutboxEvent
+from live import LiveBroker
+
+
+# Live task boards must not miss changes committed between rendering the board and its stream subscribing (user-017)
+
+@pytest.fixture
+def member(app):
+    app.config['LIVE_UPDATES_ENABLED'] = 1
+    with app.app_context():
+        db.session.execute(User.__table__.insert(), [dict(id=1, username='member', passwordHash='x', nameFirst='M', nameLast='M', email='m@example.com')])
+        db.session.execute(Organization.__table__.insert(), [dict(id=1, name='org', address='1 Street', contactUserId=1)])
+        db.session.execute(Junction.__table__.insert(), [dict(organizationId=1, userId=1, orgAdmin=True)])
+        db.session.commit()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = '1'
+        session['_fresh'] = True
+    return client
+
+def addEvent(taskId):
+    db.session.add(OutboxEvent(kind='tasks.imported', organizationId=1, taskId=taskId, payload='{}', createdAt=datetime.now()))
+    db.session.commit()
+
+def test_board_opens_its_stream_from_the_event_it_rendered(app, member):
+    with app.app_context():
+        addEvent(1)
+        addEvent(2)
+    html = member.get('/organizations/tasks/org').get_data(as_text=True)
+    assert re.search(r'/organizations/tasks/org/events\?lastEventId=2"', html)
+
+def test_broker_tails_from_the_subscriber_position(app, member):
+    broker = LiveBroker(app) # not started, polled by hand
+    with app.app_context():
+        addEvent(1)
+        subscription = broker.subscribe(1, afterId=1)
+        addEvent(2) # committed after the stream replayed, before the broker's first poll
+        broker.poll()
+    assert subscription.get_nowait()['id'] == 2
+    assert subscription.empty()
+
+def test_broker_without_subscriber_position_starts_at_the_newest_event(app, member):
+    broker = LiveBroker(app)
+    with app.app_context():
+        addEvent(1)
+        subscription = broker.subscribe(1)
+        broker.poll()
+        addEvent(2)
+        broker.poll()
+    assert subscription.get_nowait()['id'] == 2
+    assert subscription.empty()
+
+def test_board_rendered_before_any_event_replays_instead_of_reloading(app, member):
+    from live import recentDeltas
+    with app.app_context():
+        assert recentDeltas(1, 0, 10) == [] # empty outbox
+        addEvent(1)
+        assert [delta['id'] for delta in recentDeltas(1, 0, 10)] == [1]
+        addEvent(2)
+        addEvent(3)
+        OutboxEvent.query.filter(OutboxEvent.id < 3).delete()
+        db.session.commit()
+        assert recentDeltas(1, 1, 10) is None # event 2 was pruned, the browser has to reload
+        assert recentDeltas(1, 3, 10) == []
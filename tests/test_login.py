@@ -0,0 +1,64 @@
+import pytest
+from werkzeug.security import generate_password_hash
+import passwords
+from cache import LRUCache
+from extensions import db
+from models import User
+
+
+# Login throttling per client address and per attempted username, and when the login view hashes passwords (user-015)
+
+@pytest.fixture
+def hashCalls(app, monkeypatch): # fresh throttle counters, and a record of every password verified or hashed
+    calls = []
+    monkeypatch.setattr(passwords, '_loginFailures', LRUCache(maxSize=10000))
+    verify, hash = passwords.PasswordHasher.verify, passwords.PasswordHasher.hash
+    monkeypatch.setattr(passwords.PasswordHasher, 'verify', lambda self, *args: calls.append('verify') or verify(self, *args))
+    monkeypatch.setattr(passwords.PasswordHasher, 'hash', lambda self, *args: calls.append('hash') or hash(self, *args))
+    app.config.update(LOGIN_MAX_FAILURES=3, PASSWORD_HASH_METHOD='pbkdf2:sha256:2000')
+    with app.app_context():
+        db.session.execute(User.__table__.insert(), [dict(id=1, username='member', passwordHash=generate_password_hash('right', 'pbkdf2:sha256:2000', 16),
+            nameFirst='M', nameLast='M', email='m@example.com')])
+        db.session.commit()
+    return calls
+
+def login(app, username, password, address='10.0.0.1'):
+    return app.test_client().post('/login', data=dict(username=username, password=password), environ_base={'REMOTE_ADDR': address})
+
+def test_address_is_throttled_after_max_failures(app, hashCalls):
+    for i in range(3):
+        assert login(app, f'nobody{i}', 'wrong').status_code == 302
+    assert login(app, 'member', 'right').status_code == 429
+    assert login(app, 'member', 'right', address='10.0.0.2').status_code == 302 # other addresses are not affected
+
+def test_username_is_throttled_across_addresses(app, hashCalls):
+    for i in range(3):
+        assert login(app, 'member', 'wrong', address=f'10.0.1.{i}').status_code == 302
+    assert login(app, 'member', 'right', address='10.0.2.1').status_code == 429
+    assert login(app, 'someoneElse', 'wrong', address='10.0.2.1').status_code == 302
+
+def test_unknown_usernames_are_throttled_too(app, hashCalls):
+    for i in range(3):
+        login(app, 'ghost', 'wrong', address=f'10.0.3.{i}')
+    assert login(app, 'ghost', 'wrong', address='10.0.4.1').status_code == 429
+
+def test_unknown_username_never_hashes(app, hashCalls):
+    assert login(app, 'ghost', 'whatever').status_code == 302
+    assert hashCalls == []
+
+def test_throttled_login_never_hashes(app, hashCalls):
+    for i in range(3):
+        login(app, 'member', 'wrong')
+    hashCalls.clear()
+    assert login(app, 'member', 'right').status_code == 429
+    assert hashCalls == []
+
+def test_login_rehashes_password_made_with_old_settings(app, hashCalls):
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:3000'
+    assert login(app, 'member', 'right').status_code == 302
+    assert hashCalls == ['verify', 'hash']
+    with app.app_context():
+        passwordHash = User.query.get(1).passwordHash
+    assert passwordHash.startswith('pbkdf2:sha256:3000$')
+    assert login(app, 'member', 'right').status_code == 302 # new hash still accepted, and no rehash the second time
+    assert hashCalls == ['verify', 'hash', 'verify']
@@ -0,0 +1,56 @@
+from datetime import datetime
+from sqlalchemy import event
+from extensions import db
+from models import User, Organization, Junction, Task, TaskDetail
+from counters import recomputeOrgCounts
+
+
+# The task board loads its tasks with their details and people in a fixed number of queries (user-001),
+# so the query count must not grow with the number of tasks in the organization.
+
+def seedOrganization(): # the board is viewed by user 1, a member who isn't an admin, tasks are created by and assigned to users 2 to 4
+    db.session.execute(User.__table__.insert(), [dict(id=userId, username=f'member{userId}', passwordHash='x', nameFirst='M', nameLast='M', email=f'm{userId}@example.com') for userId in range(1, 5)])
+    db.session.execute(Organization.__table__.insert(), [dict(id=1, name='org', address='1 Street', contactUserId=2)])
+    db.session.execute(Junction.__table__.insert(), [dict(organizationId=1, userId=userId, orgAdmin=userId == 2) for userId in range(1, 5)])
+    db.session.commit()
+
+def assignee(taskId): # half of the tasks are assigned, a third of those are completed
+    return 2 + taskId % 3 if taskId % 2 == 0 else None
+
+def addTasks(count):
+    firstId = (db.session.query(db.func.max(Task.id)).scalar() or 0) + 1
+    ids = range(firstId, firstId + count)
+    db.session.execute(Task.__table__.insert(), [dict(id=taskId, name=f'Task {taskId}', organizationId=1, taskComplete=taskId % 6 == 0, assignedToUserId=assignee(taskId)) for taskId in ids])
+    db.session.execute(TaskDetail.__table__.insert(), [dict(taskId=taskId, createdByUserId=2 + taskId % 3, assignedByUserId=2 if assignee(taskId) else None, dateComplete=datetime.now() if taskId % 6 == 0 else None, notes=f'Notes {taskId}') for taskId in ids])
+    recomputeOrgCounts(1)
+    db.session.commit()
+
+def boardQueries(app, client):
+    statements = []
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        response = client.get('/organizations/tasks/org')
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    assert response.status_code == 200
+    return len(statements)
+
+def test_task_board_query_count_does_not_grow_with_tasks(app):
+    with app.app_context():
+        seedOrganization()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = '1'
+        session['_fresh'] = True
+    with app.app_context():
+        addTasks(20)
+    small = boardQueries(app, client)
+    with app.app_context():
+        addTasks(180) # ten times as many tasks
+    large = boardQueries(app, client)
+    assert small == large
+    assert large <= 8
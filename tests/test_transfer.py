@@ -0,0 +1,62 @@
+import io
+import threading
+import time
+import pytest
+import transfer
+from extensions import db
+from models import User, Organization, Junction, Task, TaskDetail
+from transfer import exportTasks, importTasks, reserveTaskIds
+
+
+# Task export and import (user-018)
+
+@pytest.fixture
+def org(app): # organization 1 with member 1, as an app context for the test
+    with app.app_context():
+        db.session.execute(User.__table__.insert(), [dict(id=1, username='=cmd|calc', passwordHash='x', nameFirst='U', nameLast='U', email='u@example.com')])
+        db.session.execute(Organization.__table__.insert(), [dict(id=1, name='org', address='1 Street', contactUserId=1)])
+        db.session.execute(Junction.__table__.insert(), [dict(organizationId=1, userId=1, orgAdmin=True)])
+        db.session.commit()
+        yield 1
+
+def csvImport(text, batchSize=5000):
+    return importTasks(1, io.StringIO(text), 'csv', 1, batchSize)
+
+def test_csv_export_quotes_formula_cells_and_import_reads_them_back(org):
+    names = ['=1+1', '+SUM(A1)', '-2', '@cmd', "'=already quoted", 'plain', "'plain"]
+    db.session.execute(Task.__table__.insert(), [dict(id=taskId, name=name, organizationId=1, taskComplete=False) for taskId, name in enumerate(names, 1)])
+    db.session.execute(TaskDetail.__table__.insert(), [dict(taskId=taskId, createdByUserId=1, notes='\t' + name) for taskId, name in enumerate(names, 1)])
+    db.session.commit()
+    exported = ''.join(exportTasks(1, 'csv', 100))
+    assert "'=1+1" in exported and "'+SUM(A1)" in exported and "'-2" in exported and "'@cmd" in exported and "''=already quoted" in exported
+    assert "'=cmd|calc" in exported # usernames are user input too
+    assert ",plain," in exported and ",'plain," in exported
+    Task.query.delete()
+    TaskDetail.query.delete()
+    db.session.commit()
+    assert csvImport(exported)['imported'] == len(names)
+    assert sorted(task.name for task in Task.query) == sorted(names)
+    assert sorted(detail.notes for detail in TaskDetail.query) == sorted('\t' + name for name in names)
+
+def test_import_never_takes_an_id_a_concurrent_insert_needs(app, org):
+    # the import holds its reserved ids until it commits, a task created meanwhile waits for the write lock instead of failing
+    assert csvImport('name\nfirst\n')['imported'] == 1
+    reserved = reserveTaskIds(3)
+    created = []
+    def createTask():
+        with app.app_context():
+            db.session.add(Task(name='concurrent', organizationId=1, taskComplete=False))
+            db.session.commit()
+            created.append(Task.query.filter_by(name='concurrent').one().id)
+    thread = threading.Thread(target=createTask)
+    thread.start()
+    time.sleep(0.3)
+    db.session.execute(Task.__table__.insert(), [dict(id=taskId, name=f'imported {taskId}', organizationId=1, taskComplete=False) for taskId in reserved])
+    db.session.commit()
+    thread.join(10)
+    assert created and created[0] not in reserved and created[0] > max(reserved)
+
+def test_import_without_reserved_ids_lets_the_database_assign_them(org, monkeypatch):
+    monkeypatch.setattr(transfer, 'reserveTaskIds', lambda count: None)
+    assert csvImport('name,notes\none,first\ntwo,second\nthree,third\n', batchSize=2)['imported'] == 3
+    assert {task.name: task.detail.notes for task in Task.query} == {'one': 'first', 'two': 'second', 'three': 'third'}
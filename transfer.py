@@ -0,0 +1,252 @@
+import csv
+import io
+import json
+import re
+from datetime import datetime
+from sqlalchemy import select, func
+from sqlalchemy.orm import aliased
+from extensions import db
+from models import Task, TaskDetail, User, Junction, ArchivedTask
+from counters import TaskCountDelta
+from events import publish
+
+
+# Bulk export and import of an organization's tasks as CSV or JSONL (one JSON object per line).
+# Exports read the tasks with a server side cursor (yield_per) and are produced batch by batch by a generator, so memory
+# use does not grow with the organization. Imports read the file row by row and insert TRANSFER_BATCH_SIZE rows per
+# transaction with two executemany INSERTs (tasks, task_detail). Task ids are reserved up front (see reserveTaskIds) so the
+# detail rows can be written without a round trip per task. Ids in the file are not reused, imported tasks always get new ids.
+# CSV cells that a spreadsheet would run as a formula are exported with a leading ' and read back without it.
+
+COLUMNS = ['id', 'organizationId', 'name', 'taskComplete', 'assignedToUserId', 'assignedTo', 'createdByUserId', 'createdBy', 'assignedByUserId', 'assignedBy', 'dateComplete', 'notes']
+FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+MAX_REPORTED_ERRORS = 20
+FORMULA_CELL = re.compile(r"'*[=+\-@\t\r]") # cells starting like a formula, also matching already quoted ones so quoting round trips
+
+def exportQuery(orgId):
+    assignee, creator, assignor = aliased(User), aliased(User), aliased(User)
+    return (select(Task.id, Task.organizationId, Task.name, Task.taskComplete, Task.assignedToUserId, assignee.username, TaskDetail.createdByUserId,
+            creator.username, TaskDetail.assignedByUserId, assignor.username, TaskDetail.dateComplete, TaskDetail.notes)
+        .outerjoin(TaskDetail, TaskDetail.taskId == Task.id)
+        .outerjoin(assignee, assignee.id == Task.assignedToUserId)
+        .outerjoin(creator, creator.id == TaskDetail.createdByUserId)
+        .outerjoin(assignor, assignor.id == TaskDetail.assignedByUserId)
+        .where(Task.organizationId == orgId)
+        .order_by(Task.id))
+
+def exportRows(orgId, batchSize): # batches of export rows as dicts, streamed from the database
+    result = db.session.execute(exportQuery(orgId).execution_options(yield_per=batchSize))
+    for rows in result.partitions():
+        yield [dict(zip(COLUMNS, row)) for row in rows]
+
+def exportValue(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def csvCell(value): # names, notes and usernames are user input, quote the ones spreadsheet apps would evaluate
+    if isinstance(value, str) and FORMULA_CELL.match(value):
+        return "'" + value
+    return value
+
+def csvValue(value): # imported cells without the quote csvCell added
+    if isinstance(value, str) and value.startswith("'") and FORMULA_CELL.match(value[1:]):
+        return value[1:]
+    return value
+
+def exportTasks(orgId, format, batchSize): # generator of text chunks, one per batch of rows
+    if format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(COLUMNS)
+        for rows in exportRows(orgId, batchSize):
+            writer.writerows([['true' if row[column] is True else 'false' if row[column] is False else csvCell(exportValue(row[column])) for column in COLUMNS] for row in rows])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue() # header of an empty export
+    else:
+        for rows in exportRows(orgId, batchSize):
+            yield ''.join(json.dumps({column: exportValue(row[column]) for column in COLUMNS}) + '\n' for row in rows)
+
+
+# import
+
+def readRows(textFile, format):
+    # dicts for each record of a CSV or JSONL file. A JSONL line that isn't valid JSON is yielded as a ValueError so the
+    # importer skips it and carries on with the next line. A file that can't be read any further raises instead
+    if format == 'csv':
+        for row in csv.DictReader(textFile):
+            yield {column: csvValue(value) for column, value in row.items()}
+        return
+    for lineNumber, line in enumerate(textFile, 1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield ValueError(f'line {lineNumber} is not valid JSON')
+
+def parseBool(value):
+    if isinstance(value, bool) or value is None:
+        return bool(value)
+    value = str(value).strip().lower()
+    if value in ('true', '1', 'yes', 'y'):
+        return True
+    if value in ('false', '0', 'no', 'n', ''):
+        return False
+    raise ValueError(f'taskComplete must be true or false, not {value!r}')
+
+def parseText(value, column): # JSONL values can be any JSON type, only strings (or nothing) are stored as text
+    if value is not None and not isinstance(value, str):
+        raise ValueError(f'{column} must be a string, not {json.dumps(value)}')
+    return value
+
+def parseId(value, column): # whole number ids, from an int or a string of digits, never a bool or a float
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    raise ValueError(f'{column} {value!r} is not a whole number')
+
+def nextTaskId(): # first id above every task id handed out so far, live or archived, so an archived task's id is never reused
+    lastId = max(db.session.query(func.max(Task.id)).scalar() or 0, db.session.query(func.max(ArchivedTask.id)).scalar() or 0)
+    if db.engine.dialect.name == 'sqlite': # AUTOINCREMENT also remembers ids of purged tasks
+        lastId = max(lastId, db.session.execute(db.text("SELECT seq FROM sqlite_sequence WHERE name = 'tasks'")).scalar() or 0)
+    return lastId + 1
+
+def reserveTaskIds(count): # ids for count new tasks that no concurrent insert can take, None where only the insert itself can assign them
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql': # drawn from the tasks sequence, other inserts simply get the values after them
+        return [row[0] for row in db.session.execute(db.text("SELECT nextval(pg_get_serial_sequence('tasks', 'id')) FROM generate_series(1, :count)"), dict(count=count))]
+    if dialect == 'sqlite':
+        # the no-op UPDATE takes SQLite's write lock, so no other connection can insert a task before this transaction ends
+        db.session.execute(db.text("UPDATE sqlite_sequence SET seq = seq WHERE name = 'tasks'"))
+        firstId = nextTaskId()
+        return list(range(firstId, firstId + count))
+    return None
+
+class ImportBatch: # validated rows waiting to be inserted in one transaction
+    def __init__(self, orgId):
+        self.orgId = orgId
+        self.tasks = []
+        self.details = []
+        self.counts = TaskCountDelta(orgId)
+
+class TaskImporter:
+    def __init__(self, orgId, actorId, batchSize):
+        self.orgId = orgId
+        self.actorId = actorId # becomes the creator of rows that don't name one, and the actor of the tasks.imported events
+        self.batchSize = batchSize
+        # every member of the organization by id and by username, assignees have to be members
+        self.members = dict(db.session.query(User.id, User.username).join(Junction, Junction.userId == User.id).filter(Junction.organizationId == orgId))
+        self.memberIds = {username: userId for userId, username in self.members.items()}
+        self.otherUsers = {}
+        self.imported = 0
+        self.skipped = 0
+        self.errors = []
+
+    def user(self, row, idColumn, nameColumn, membersOnly): # user id named by the row's id or username column, None when both are blank
+        userId, username = row.get(idColumn), parseText(row.get(nameColumn), nameColumn)
+        if userId not in (None, ''):
+            userId = parseId(userId, idColumn)
+            if userId not in self.members and (membersOnly or self.userId(id=userId) is None):
+                raise ValueError(f'{idColumn} {userId} is not a member of the organization' if membersOnly else f'{idColumn} {userId} does not exist')
+            return userId
+        if username not in (None, ''):
+            userId = self.memberIds.get(username)
+            if userId is None and not membersOnly:
+                userId = self.userId(username=username)
+            if userId is None:
+                raise ValueError(f'{nameColumn} {username!r} is not a member of the organization' if membersOnly else f'{nameColumn} {username!r} does not exist')
+            return userId
+        return None
+
+    def userId(self, **filters): # id of a user outside the organization (e.g. the creator of a task who has since left), remembered per import
+        key = tuple(filters.items())
+        if key not in self.otherUsers:
+            self.otherUsers[key] = db.session.query(User.id).filter_by(**filters).scalar()
+        return self.otherUsers[key]
+
+    def validate(self, row): # (task values, detail values) for a row, ValueError describing the first problem
+        if isinstance(row, ValueError): # a line readRows couldn't parse
+            raise row
+        if not isinstance(row, dict):
+            raise ValueError('record is not an object')
+        orgId = row.get('organizationId')
+        if orgId not in (None, '') and str(orgId) != str(self.orgId):
+            raise ValueError(f'organizationId {orgId} does not match the organization being imported into, remove the column to import another organization\'s tasks')
+        name = (parseText(row.get('name'), 'name') or '').strip()
+        if not name:
+            raise ValueError('name is required')
+        if len(name) > Task.name.type.length:
+            raise ValueError(f'name is longer than {Task.name.type.length} characters')
+        complete = parseBool(row.get('taskComplete'))
+        assigneeId = self.user(row, 'assignedToUserId', 'assignedTo', membersOnly=True) # tasks can only be assigned to members
+        creatorId = self.user(row, 'createdByUserId', 'createdBy', membersOnly=False) or self.actorId
+        if creatorId is None:
+            raise ValueError('createdBy is required')
+        assignorId = self.user(row, 'assignedByUserId', 'assignedBy', membersOnly=False) if assigneeId is not None else None
+        dateComplete = parseText(row.get('dateComplete'), 'dateComplete') or None
+        if dateComplete is not None:
+            try:
+                dateComplete = datetime.fromisoformat(dateComplete)
+            except (TypeError, ValueError):
+                raise ValueError(f'dateComplete {dateComplete!r} is not an ISO 8601 date')
+        elif complete:
+            dateComplete = datetime.now()
+        task = dict(name=name, organizationId=self.orgId, assignedToUserId=assigneeId, taskComplete=complete)
+        detail = dict(createdByUserId=creatorId, assignedByUserId=assignorId, dateComplete=dateComplete if complete else None, notes=parseText(row.get('notes'), 'notes') or None)
+        return task, detail
+
+    def run(self, rows): # validate and insert every row, returns a summary dict
+        batch = ImportBatch(self.orgId)
+        rowNumber = 0
+        try:
+            for rowNumber, row in enumerate(rows, 1):
+                try:
+                    task, detail = self.validate(row)
+                except ValueError as error:
+                    self.reject(rowNumber, error)
+                    continue
+                batch.tasks.append(task)
+                batch.details.append(detail)
+                batch.counts.change(None, (task['taskComplete'], task['assignedToUserId']))
+                if len(batch.tasks) >= self.batchSize:
+                    self.insert(batch)
+                    batch = ImportBatch(self.orgId)
+        except (ValueError, csv.Error) as error: # the file itself is unreadable past this point, e.g. not UTF-8
+            self.skipped += 1
+            self.errors.append(f'row {rowNumber + 1}: {error}, the rest of the file was not read') # reported even past MAX_REPORTED_ERRORS
+        self.insert(batch)
+        return dict(imported=self.imported, skipped=self.skipped, errors=self.errors)
+
+    def reject(self, rowNumber, error):
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f'row {rowNumber}: {error}')
+
+    def insert(self, batch): # one transaction per batch
+        if not batch.tasks:
+            return
+        taskIds = reserveTaskIds(len(batch.tasks))
+        if taskIds is None: # one INSERT per task, the database assigns each id
+            taskIds = [db.session.execute(Task.__table__.insert(), task).inserted_primary_key[0] for task in batch.tasks]
+        else:
+            for task, taskId in zip(batch.tasks, taskIds):
+                task['id'] = taskId
+            db.session.execute(Task.__table__.insert(), batch.tasks)
+        for detail, taskId in zip(batch.details, taskIds):
+            detail['taskId'] = taskId
+        db.session.execute(TaskDetail.__table__.insert(), batch.details)
+        batch.counts.apply()
+        publish('tasks.imported', self.orgId, actorUserId=self.actorId, count=len(batch.tasks))
+        db.session.commit()
+        self.imported += len(batch.tasks)
+
+def importTasks(orgId, textFile, format, actorId=None, batchSize=5000):
+    # import tasks from an open text file, rows with problems are skipped and reported, everything else is committed
+    return TaskImporter(orgId, actorId, batchSize).run(readRows(textFile, format))
+
+def detectFormat(filename, default='csv'): # format from a file name's extension
+    extension = filename.rsplit('.', 1)[-1].lower() if filename and '.' in filename else ''
+    return {'csv': 'csv', 'jsonl': 'jsonl', 'ndjson': 'jsonl', 'json': 'jsonl'}.get(extension, default)
@@ -0,0 +1,130 @@
+from flask import Blueprint, request, abort, render_template, redirect, url_for, flash
+from flask_login import login_user, logout_user, current_user, login_required
+from extensions import db
+from models import Organization, User, Junction
+from queries import keysetPage, userActivity
+import cache
+from responsecache import cachedResponse, bumpAfterCommit
+from passwords import loginThrottled, recordLoginFailure, needsRehash
+from routes import is_safe_url, pageArgs, navBar404URLs
+
+
+# routes for logging in and user management, forms are imported by the views that use them (see routes.py)
+
+blueprint = Blueprint('users', __name__)
+
+@blueprint.route('/login', methods=['GET', 'POST'])
+def login():
+    from forms import LoginForm
+    if current_user.is_authenticated: #if user already logged in, redirect to user profile
+        flash('You are already logged in')
+        return redirect(url_for('main.landingPage', _external=True, _scheme='HTTPS'))
+    form = LoginForm()
+    if form.validate_on_submit():
+        if loginThrottled(request.remote_addr, form.username.data): # too many failures from this address or for this username, refuse before any lookup or hashing
+            flash('Too many failed login attempts, please try again later')
+            return render_template('login.html', title='Sign in to TaskTracker', form=form), 429
+        user = User.query.filter_by(username=form.username.data).first()
+        if not user or not user.check_pw_hash(form.password.data): #if login data is incorrect, inform user and redirect to login page
+            recordLoginFailure(request.remote_addr, form.username.data)
+            flash('Invalid username or password')
+            return redirect(url_for('users.login', _external=True, _scheme='HTTPS'))
+        if needsRehash(user.passwordHash): # hash settings changed since the password was set, store it with the current ones
+            user.set_pw_hash(form.password.data)
+            db.session.commit()
+            cache.invalidate('user', user.id)
+        login_user(user, remember=form.rememberMe.data) #if successful: login, inform user, redirect to user task page
+        flash('Login successful')
+        next = request.args.get('next') # if login happens after @login_required redirect, use next parameter built into login_required to redirect to originally requested page rather than 'tasks' page
+        if next in navBar404URLs: # check if next URL is static 404 URL rather than dynamic URL (for dynamic URLs requiring user login but accessible from nav bar)
+            next += current_user.username # add username to redirect to approrpriate dynamic URL
+        if not is_safe_url(next): # ensure redirect target is safe
+            return abort(400)
+        return redirect(next or url_for('tasks.tasks', username=current_user.username, _external=True, _scheme='HTTPS'))
+    return render_template('login.html', title='Sign in to TaskTracker', form=form) #render login html template, pass form
+
+@blueprint.route('/logout')
+@login_required
+def logout():
+    logout_user()
+    flash('Logout successful')
+    return redirect(url_for('main.landingPage', _external=True, _scheme="HTTPS"))
+
+# routes for user management
+
+@blueprint.route('/users/register', methods=['GET', 'POST'])
+def userRegistration():
+    from forms import UserRegistrationForm, ValidationError
+    if current_user.is_authenticated:
+        flash('You are already logged in')
+        return redirect(url_for('main.landingPage', _external=True, _scheme='HTTPS'))
+    form = UserRegistrationForm()
+    if form.validate_on_submit():
+        try:
+            if form.validateUsername(form.username.data): # ensure username is unique
+                try:
+                    if form.validateEmail(form.email.data): # ensure email is unique
+                        user = User(username=form.username.data, nameFirst=form.nameFirst.data, nameLast=form.nameLast.data, email=form.email.data, about=form.about.data)
+                        user.set_pw_hash(form.password.data)
+                        db.session.add(user)
+                        bumpAfterCommit(db.session, 'users') # new user shows up on the cached user browse pages
+                        db.session.commit()
+                        flash('Congratulations, you are now a registered user!')
+                        return redirect(url_for('users.login', _external=True, _scheme='HTTPS'))
+                except ValidationError: # give appropriate error message if username or password is not unique
+                    form.email.errors.append('Email address is already in use.')
+        except ValidationError:
+            form.username.errors.append('Username is already in use.')
+    return render_template('userRegistration.html', title='TaskTracker User Registration', form=form)
+
+@blueprint.route('/users/profile/<username>', methods=['GET', 'POST'])
+@login_required
+def userProfile(username):
+    from forms import AboutForm
+    user = User.query.filter_by(username=username).first_or_404()
+    if current_user.username == user.username: #if user viewing their own profile, allow update of AboutMe
+        form = AboutForm()
+        if form.validate_on_submit():
+            user.about = form.about.data
+            db.session.commit()
+            cache.invalidate('user', user.id)
+            return redirect(url_for('users.userProfile', username=user.username, _external=True, _scheme="HTTPS"))
+    else:
+        form = None
+    # create list of (User object, Org object) tuples for every organzation associated with selected user
+    userOrgPairs = db.session.query(User, Organization).filter(Junction.userId == User.id, Junction.organizationId == Organization.id).filter(User.id == user.id).all()
+    userOrganizations = [pair[1] for pair in userOrgPairs] # make list of just organizations belonging to selected user
+    return render_template('userProfile.html', title=f"{user.username}'s TaskTracker Profile", user=user, form=form, userOrganizations=userOrganizations)
+
+@blueprint.route('/users/profile/')
+@login_required
+def userProfile404(): # static route used by @login_required if non logged in user clicks nav bar link
+    pass
+
+@blueprint.route('/users/organizations/<username>')
+@login_required
+def userOrganizations(username):
+    user = User.query.filter_by(username=username).first()
+    # create list of (User object, Org object) tuples for every organzation associated with selected user
+    userOrgPairs = db.session.query(User, Organization).filter(Junction.userId == User.id, Junction.organizationId == Organization.id).filter(User.id == user.id).all()
+    userOrganizations = [pair[1] for pair in userOrgPairs] # make list of just organizations belonging to selected user
+    return render_template('userOrganizations.html', title='Your Organization Memberships', userOrganizations=userOrganizations)
+
+@blueprint.route('/users/organizations/')
+@login_required
+def userOrganizations404(): # static route used by @login_required if non logged in user clicks nav bar link
+    pass
+
+@blueprint.route('/users/browse')
+@cachedResponse(lambda: ['users'])
+def userBrowse():
+    page = keysetPage(User.query, User.id, **pageArgs())
+    return render_template('userBrowse.html', title='Browse TaskTracker Users', users=page.items, page=page)
+
+@blueprint.route('/users/activity')
+@login_required
+def activityFeed(): # the current user's activity across every organization
+    page = userActivity(current_user.id, **pageArgs())
+    orgIds = {entry.organizationId for entry in page.items}
+    orgNames = dict(db.session.query(Organization.id, Organization.name).filter(Organization.id.in_(orgIds))) if orgIds else {}
+    return render_template('activityFeed.html', title='Your Recent Activity', entries=page.items, orgNames=orgNames, page=page)
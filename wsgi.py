@@ -0,0 +1,23 @@
+from app import create_app
+from extensions import db
+from passwords import passwordHasher
+from events import startEventWorker
+
+
+# WSGI entry point for production servers: gunicorn -c gunicorn.conf.py wsgi:app
+
+app = create_app()
+
+def warmUp():
+    # per worker initialization, called by gunicorn after the worker process has forked (see gunicorn.conf.py)
+    # so database connections and compiled templates are never shared between processes
+    with app.app_context():
+        db.engine.dispose() # drop any pooled connections inherited from the parent process
+        db.session.execute(db.text('SELECT 1')) # create the engine and open the first pooled connection
+        db.session.remove()
+        for name in app.jinja_env.list_templates(): # compile every template into the jinja cache before the first request
+            app.jinja_env.get_template(name)
+        import forms # imported lazily by the views, load Flask-WTF/WTForms now rather than during the first request
+        passwordHasher().start() # spawn the password hashing processes now rather than during the first login (PASSWORD_HASH_WORKERS)
+    if app.config['EVENT_WORKER_ENABLED']:
+        startEventWorker(app) # background thread consuming the task event outbox (see events.py)